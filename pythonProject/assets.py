@@ -0,0 +1,118 @@
+"""Fingerprinted static assets.
+
+Every file under ``static/`` is served at ``/assets/<name>.<hash><ext>``,
+where the hash comes from its contents, so the URL changes whenever the file
+does and browsers may cache each one for a year without revalidating.
+Templates get URLs from ``asset_url('css/app.css')``.
+
+Files are read once per process (by ``load()``, or on the first URL or
+request that needs them) and kept in memory along with their gzip (and, if
+available, brotli) encodings, so serving an asset never touches the disk or
+compresses anything per request.  The encodings are also written to
+``cache_dir``, keyed by content hash, so later processes read them back
+instead of compressing again.
+"""
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import abort, make_response, request
+
+import compression
+
+ONE_YEAR = 365 * 24 * 3600
+
+
+class Asset:
+    __slots__ = ('mimetype', 'etag', 'bodies')
+
+    def __init__(self, mimetype, etag, bodies):
+        self.mimetype = mimetype
+        self.etag = etag
+        # encoding ('identity', 'gzip', 'br') -> bytes
+        self.bodies = bodies
+
+
+class AssetManifest:
+    def __init__(self, root, cache_dir=None):
+        self.root = root
+        self.cache_dir = cache_dir
+        self.urls = {}
+        self._assets = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read, fingerprint and compress every file; later calls do nothing."""
+        if self._assets is not None:
+            return
+        with self._lock:
+            if self._assets is not None:
+                return
+            found = {}
+            for directory, _, files in os.walk(self.root):
+                for filename in files:
+                    path = os.path.join(directory, filename)
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    logical = os.path.relpath(path, self.root).replace(os.sep, '/')
+                    digest = hashlib.sha256(data).hexdigest()[:12]
+                    stem, ext = os.path.splitext(logical)
+                    name = f'{stem}.{digest}{ext}'
+                    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                    bodies = {'identity': data}
+                    if mimetype in compression.COMPRESSIBLE:
+                        for encoding in compression.encodings():
+                            encoded = self._compress(name, data, encoding)
+                            if len(encoded) < len(data):
+                                bodies[encoding] = encoded
+                    found[name] = Asset(mimetype, digest, bodies)
+                    self.urls[logical] = '/assets/' + name
+            self._assets = found
+
+    def _compress(self, name, data, encoding):
+        # Brotli's top level takes the better part of a second on the
+        # vendored CSS, which every new worker would otherwise pay again.
+        if self.cache_dir is None:
+            return compression.compress(data, encoding, compression.STATIC_LEVELS)
+        path = os.path.join(self.cache_dir, f"{name.replace('/', '_')}.{encoding}")
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        encoded = compression.compress(data, encoding, compression.STATIC_LEVELS)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write then rename, so a worker starting alongside never reads half a file.
+        partial = f'{path}.{os.getpid()}.tmp'
+        with open(partial, 'wb') as f:
+            f.write(encoded)
+        os.replace(partial, path)
+        return encoded
+
+    def url(self, path):
+        self.load()
+        # A KeyError here means a template names a file that isn't in static/.
+        return self.urls[path]
+
+    def serve(self, name):
+        self.load()
+        asset = self._assets.get(name)
+        if asset is None:
+            abort(404)
+        if request.if_none_match.contains(asset.etag):
+            response = make_response('', 304)
+        else:
+            encoding = compression.choose_encoding(request.accept_encodings, asset.bodies)
+            response = make_response(asset.bodies[encoding or 'identity'])
+            response.mimetype = asset.mimetype
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(asset.etag)
+        response.headers['Cache-Control'] = f'public, max-age={ONE_YEAR}, immutable'
+        return response
+
+    def init_app(self, app):
+        app.add_url_rule('/assets/<path:name>', 'asset', self.serve)
+        app.jinja_env.globals['asset_url'] = self.url
@@ -0,0 +1,100 @@
+"""Timed jobs that run inside the web workers.
+
+There is no separate scheduler process: each gunicorn worker starts a
+scheduler thread the first time it serves a request, and a database lease
+(see ``leader``) decides which one worker actually runs the jobs, so the
+archive and reminders are handled once however many workers there are.
+Under gevent workers the thread is a greenlet and its waits yield to
+requests.
+"""
+import functools
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+
+class Scheduler:
+    """Runs jobs at given times from a heap, in one thread per process.
+
+    The thread sleeps until the earliest entry is due, so queued jobs cost
+    nothing until then.  ``leader()`` is called every ``lease_interval``
+    seconds to take or renew the lease; jobs marked ``leader_only`` are
+    skipped while this process does not hold it.  Jobs share the thread,
+    so each should finish quickly.
+    """
+
+    def __init__(self, logger, leader=None, lease_interval=10):
+        self.logger = logger
+        self.leader = leader
+        self.is_leader = leader is None
+        self._heap = []
+        self._seq = itertools.count()
+        self._ready = threading.Condition()
+        self._lock = threading.Lock()
+        self._pid = None
+        if leader is not None:
+            self.every(lease_interval, self._renew_lease, leader_only=False, delay=0)
+
+    def at(self, when, fn, leader_only=True):
+        """Run ``fn()`` once at ``when`` (a ``time.time()`` value)."""
+        with self._ready:
+            heapq.heappush(self._heap, (when, next(self._seq), fn, leader_only))
+            self._ready.notify()
+
+    def every(self, interval, fn, leader_only=True, delay=None):
+        """Run ``fn()`` every ``interval`` seconds; 0 disables it.
+
+        The first run waits ``delay`` seconds, or a random part of the
+        interval so workers that start together don't all run it at once.
+        """
+        if interval <= 0:
+            return
+
+        @functools.wraps(fn)
+        def run():
+            self.at(time.time() + interval, run, leader_only=False)
+            if not leader_only or self.is_leader:
+                fn()
+
+        if delay is None:
+            delay = random.uniform(0, interval)
+        self.at(time.time() + delay, run, leader_only=False)
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.is_leader = self.leader is None
+            threading.Thread(target=self._run, name='scheduler', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _renew_lease(self):
+        try:
+            self.is_leader = bool(self.leader())
+        except Exception:
+            self.is_leader = False
+            raise
+
+    def _next_job(self):
+        with self._ready:
+            while True:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    _, _, fn, leader_only = heapq.heappop(self._heap)
+                    return fn, leader_only
+                self._ready.wait(self._heap[0][0] - now if self._heap else None)
+
+    def _run(self):
+        while True:
+            fn, leader_only = self._next_job()
+            if leader_only and not self.is_leader:
+                continue
+            try:
+                fn()
+            except Exception:
+                self.logger.exception('scheduled job %r failed', getattr(fn, '__name__', fn))
@@ -0,0 +1,226 @@
+"""Consistent online backups of tasks.db.
+
+Each run copies the live database with SQLite's online backup API in a
+single step, from one read transaction.  In WAL mode writers carry on while
+it runs; in rollback-journal mode they wait for the copy.  (A copy taken in
+several steps restarts whenever another connection writes, so on a busy
+database it may never finish.)  The copy is then stored in the backup
+directory as either
+
+* a full snapshot: the whole copy, gzipped (``full-<stamp>.db.gz``), or
+* a delta: only the pages that changed since the previous run, gzipped
+  (``delta-<stamp>.pages.gz``).
+
+``manifest.json`` lists the files in order and is only rewritten once a
+file is complete, so the directory can be shipped by any uploader (rclone,
+rsync, ...) at any time.  ``restore`` rebuilds a database from the latest
+full snapshot plus the deltas after it.
+
+    python backup.py [path/to/tasks.db] [--dir backups] [--full]
+    python backup.py --dir backups --restore restored.db
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(HERE, 'tasks.db')
+DEFAULT_DIR = os.path.join(HERE, 'backups')
+
+DELTA_MAGIC = b'TMDELTA1'
+HASH_SIZE = 16
+
+
+def _page_hash(page):
+    return hashlib.blake2b(page, digest_size=HASH_SIZE).digest()
+
+
+def _atomic_write(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_manifest(backup_dir):
+    try:
+        with open(os.path.join(backup_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'entries': []}
+
+
+@contextmanager
+def _exclusive(path):
+    """Hold an exclusive lock on ``path`` for the duration of the block."""
+    with open(path, 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+            return
+        # msvcrt gives up after ten one-second retries; keep waiting.
+        while True:
+            try:
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                break
+            except OSError:
+                continue
+        try:
+            yield
+        finally:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def online_copy(db_path, target_path):
+    """Copy a live database into ``target_path`` and return its page size."""
+    src = sqlite3.connect(db_path, timeout=30)
+    dst = sqlite3.connect(target_path)
+    try:
+        src.backup(dst)
+        return dst.execute('PRAGMA page_size').fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+
+
+def _read_pages(path, page_size):
+    with open(path, 'rb') as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                return
+            yield page
+
+
+def snapshot(db_path=DEFAULT_DB, backup_dir=DEFAULT_DIR, full=False, full_every=7):
+    """Back up ``db_path`` into ``backup_dir`` and return the new manifest entry.
+
+    A full snapshot is written when asked for, when there is no usable
+    previous state, or after ``full_every`` consecutive deltas; otherwise a
+    delta of changed pages.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    # One backup at a time per directory (cron and the HTTP endpoint may overlap).
+    with _exclusive(os.path.join(backup_dir, '.lock')):
+        return _snapshot(db_path, backup_dir, full, full_every)
+
+
+def _snapshot(db_path, backup_dir, full, full_every):
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    copy_path = os.path.join(backup_dir, f'.copy-{stamp}.db')
+    try:
+        page_size = online_copy(db_path, copy_path)
+        manifest = load_manifest(backup_dir)
+        entries = manifest['entries']
+        # Each entry records per-page fingerprints of the state it captured;
+        # a delta is only ever taken against the last committed entry's.
+        previous = b''
+        if entries and os.path.exists(os.path.join(backup_dir, entries[-1]['hashes'])):
+            with open(os.path.join(backup_dir, entries[-1]['hashes']), 'rb') as f:
+                previous = f.read()
+        deltas_since_full = 0
+        for entry in reversed(entries):
+            if entry['kind'] == 'full':
+                break
+            deltas_since_full += 1
+        need_full = (full or not entries or not previous
+                     or entries[-1]['page_size'] != page_size
+                     or deltas_since_full >= full_every)
+
+        hashes = bytearray()
+        changed = 0
+        if need_full:
+            name = f'full-{stamp}.db.gz'
+            with open(copy_path, 'rb') as src, gzip.open(os.path.join(backup_dir, name), 'wb') as out:
+                shutil.copyfileobj(src, out)
+            for page in _read_pages(copy_path, page_size):
+                hashes += _page_hash(page)
+            changed = len(hashes) // HASH_SIZE
+        else:
+            name = f'delta-{stamp}.pages.gz'
+            with gzip.open(os.path.join(backup_dir, name), 'wb') as out:
+                out.write(DELTA_MAGIC + struct.pack('>I', page_size))
+                for number, page in enumerate(_read_pages(copy_path, page_size)):
+                    digest = _page_hash(page)
+                    hashes += digest
+                    offset = number * HASH_SIZE
+                    if previous[offset:offset + HASH_SIZE] != digest:
+                        out.write(struct.pack('>I', number) + page)
+                        changed += 1
+        page_count = len(hashes) // HASH_SIZE
+
+        entry = {'file': name, 'kind': 'full' if need_full else 'delta',
+                 'hashes': f'.{stamp}.hashes', 'created': stamp, 'page_size': page_size,
+                 'page_count': page_count, 'pages_written': changed}
+        _atomic_write(os.path.join(backup_dir, entry['hashes']), bytes(hashes))
+        entries.append(entry)
+        _atomic_write(os.path.join(backup_dir, 'manifest.json'),
+                      json.dumps(manifest, indent=2).encode())
+        if len(entries) > 1:
+            stale = os.path.join(backup_dir, entries[-2]['hashes'])
+            if os.path.exists(stale):
+                os.remove(stale)
+        return entry
+    finally:
+        if os.path.exists(copy_path):
+            os.remove(copy_path)
+
+
+def restore(backup_dir, target_path):
+    """Rebuild a database file from the latest full snapshot and later deltas."""
+    entries = load_manifest(backup_dir)['entries']
+    fulls = [i for i, e in enumerate(entries) if e['kind'] == 'full']
+    if not fulls:
+        raise RuntimeError(f'no full snapshot in {backup_dir}')
+    start = fulls[-1]
+    with gzip.open(os.path.join(backup_dir, entries[start]['file']), 'rb') as src, \
+            open(target_path, 'wb') as out:
+        shutil.copyfileobj(src, out)
+    with open(target_path, 'r+b') as out:
+        for entry in entries[start + 1:]:
+            page_size = entry['page_size']
+            with gzip.open(os.path.join(backup_dir, entry['file']), 'rb') as delta:
+                if delta.read(len(DELTA_MAGIC)) != DELTA_MAGIC:
+                    raise RuntimeError(f"{entry['file']} is not a delta file")
+                delta.read(4)
+                while True:
+                    header = delta.read(4)
+                    if not header:
+                        break
+                    number, = struct.unpack('>I', header)
+                    out.seek(number * page_size)
+                    out.write(delta.read(page_size))
+            out.truncate(entry['page_count'] * page_size)
+    return entries[-1]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('database', nargs='?', default=DEFAULT_DB)
+    parser.add_argument('--dir', default=DEFAULT_DIR, help='backup directory')
+    parser.add_argument('--full', action='store_true', help='force a full snapshot')
+    parser.add_argument('--full-every', type=int, default=7,
+                        help='deltas between full snapshots')
+    parser.add_argument('--restore', metavar='TARGET',
+                        help='rebuild the database into TARGET instead of backing up')
+    args = parser.parse_args()
+    if args.restore:
+        print(json.dumps(restore(args.dir, args.restore)))
+    else:
+        print(json.dumps(snapshot(args.database, args.dir, args.full, args.full_every)))
@@ -0,0 +1,528 @@
+"""Reproducible benchmarks for the task manager.
+
+Seeds a throwaway SQLite database with users and tasks, then drives the
+main routes either in-process through Flask's test client or over HTTP with
+several load-generating processes (optionally against a gunicorn it starts
+itself, in either serving mode).  ``--idle-connections`` holds that many
+``/events`` streams open while the scenarios run, to see what a crowd of
+idle dashboards costs, and ``--shards`` spreads the users over that many
+shard files (see shards.py) to compare write throughput.  ``--startup``
+times cold starts instead: importing the app, ``create_app()`` and the
+first requests of a fresh process, or a gunicorn boot up to its first
+response.  Reports p50/p95/p99 latency and throughput per scenario and saves
+the numbers as JSON so runs can be compared.
+
+    python bench.py                                  # test client, defaults
+    python bench.py --users 200 --tasks-per-user 500 --distribution zipf
+    python bench.py --http --start-gunicorn --workers 4 --processes 8
+    python bench.py --http --start-gunicorn --serve-mode gevent --idle-connections 2000
+    python bench.py --http --start-gunicorn --workers 4 --scenarios toggle,delete --shards 4
+    python bench.py --startup --start-gunicorn --workers 4
+    python bench.py --compare bench-results/old.json
+
+Nothing here touches tasks.db; the database lives in --db (a temp file by
+default).
+"""
+import argparse
+import http.cookiejar
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = ('index', 'toggle', 'delete', 'login', 'signup')
+PASSWORD = 'bench-password'
+
+
+# ---------------------------------------------------------------------------
+# Seeding
+# ---------------------------------------------------------------------------
+
+def tasks_for_user(rng, index, args):
+    if args.distribution == 'fixed':
+        return args.tasks_per_user
+    if args.distribution == 'uniform':
+        return rng.randint(0, 2 * args.tasks_per_user)
+    # zipf-like: a few heavy users, a long tail of light ones, same mean.
+    harmonic = sum(1 / (i + 1) for i in range(args.users))
+    return max(1, int(args.tasks_per_user * args.users / (harmonic * (index + 1))))
+
+
+def shard_paths(db_path, count):
+    base, ext = os.path.splitext(os.path.abspath(db_path))
+    return [f'{base}-shard{n}{ext}' for n in range(count)]
+
+
+def seed(db_path, args):
+    """Create the schema through the app, then bulk-insert users and tasks.
+
+    With ``--shards`` the users go in the main database as the directory,
+    and each user's stub row and tasks in the shard file for ``id % N``,
+    as signup would place them.
+    """
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(db_path)
+    os.environ['SHARD_COUNT'] = str(args.shards)
+    if args.shards:
+        base, ext = os.path.splitext(os.path.abspath(db_path))
+        os.environ['SHARD_DATABASE_URL'] = f'sqlite:///{base}-shard{{n}}{ext}'
+    # The benchmark logs in far faster than any person; don't rate-limit it.
+    os.environ.setdefault('LOGIN_RATE_PER_USER', '0')
+    os.environ.setdefault('LOGIN_RATE_PER_IP', '0')
+    sys.path.insert(0, HERE)
+    import main
+
+    rng = random.Random(args.seed)
+    with main.app.app_context():
+        main.init_db()
+        # One hash for everyone: seeding should not spend minutes in PBKDF2.
+        password = main.hash_password(PASSWORD)
+    today = date.today()
+    conn = sqlite3.connect(db_path)
+    conn.executemany('INSERT INTO user (username, password, description, data_version) '
+                     'VALUES (?, ?, ?, 0)',
+                     [(f'bench-{i}', password, '') for i in range(args.users)])
+    user_ids = [row[0] for row in conn.execute('SELECT id FROM user ORDER BY id')]
+    shard_conns = [sqlite3.connect(path) for path in shard_paths(db_path, args.shards)]
+    if shard_conns:
+        conn.execute('UPDATE user SET shard = id % ?', (args.shards,))
+        for user_id in user_ids:
+            shard_conns[user_id % args.shards].execute(
+                "INSERT INTO user (id, username, password, description, data_version, shard) "
+                "VALUES (?, ?, '', '', 0, ?)", (user_id, str(user_id), user_id % args.shards))
+    total = 0
+    for index, user_id in enumerate(user_ids):
+        rows = []
+        for n in range(tasks_for_user(rng, index, args)):
+            due = today + timedelta(days=rng.randint(-args.days, args.days))
+            rows.append((f'task {n} for user {user_id}', rng.randint(1, 3), due.isoformat(),
+                         rng.random() < 0.5, f'{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00',
+                         user_id))
+        task_conn = shard_conns[user_id % args.shards] if shard_conns else conn
+        task_conn.executemany('INSERT INTO task (text, priority, due_date, completed, time, user_id) '
+                              'VALUES (?, ?, ?, ?, ?, ?)', rows)
+        total += len(rows)
+    for each in [conn] + shard_conns:
+        each.commit()
+        each.close()
+    # The tasks went in behind the app's back, so derive its summary table.
+    with main.app.app_context():
+        for shard in main.router.shards():
+            with main.router.engine(shard).begin() as engine_conn:
+                main.rebuild_daily_summary(engine_conn)
+    for path in [db_path] + shard_paths(db_path, args.shards):
+        conn = sqlite3.connect(path)
+        conn.execute('ANALYZE')
+        conn.close()
+    return {'users': len(user_ids), 'tasks': total, 'shards': args.shards}
+
+
+def task_ids_by_user(db_path, shards=0):
+    conn = sqlite3.connect(db_path)
+    usernames = dict(conn.execute('SELECT id, username FROM user'))
+    conn.close()
+    ids = {}
+    for path in [db_path] + shard_paths(db_path, shards):
+        conn = sqlite3.connect(path)
+        for task_id, user_id in conn.execute('SELECT id, user_id FROM task'):
+            ids.setdefault(usernames[user_id], []).append(task_id)
+        conn.close()
+    return ids
+
+
+# ---------------------------------------------------------------------------
+# Statistics
+# ---------------------------------------------------------------------------
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 3)
+    return {
+        'count': len(values),
+        'errors': errors,
+        'mean_ms': ms(sum(values) / len(values)) if values else None,
+        'p50_ms': ms(percentile(values, 50)),
+        'p95_ms': ms(percentile(values, 95)),
+        'p99_ms': ms(percentile(values, 99)),
+        'throughput_rps': round(len(values) / elapsed, 2) if elapsed else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# In-process mode (Flask test client)
+# ---------------------------------------------------------------------------
+
+def run_test_client(args, task_ids):
+    import main
+    main.create_app()
+
+    rng = random.Random(args.seed)
+    usernames = sorted(task_ids) or [f'bench-{i}' for i in range(args.users)]
+    sessions = []
+    for username in rng.sample(usernames, min(args.sessions, len(usernames))):
+        client = main.app.test_client()
+        client.post('/login', data={'username': username, 'password': PASSWORD})
+        sessions.append((username, client))
+
+    def request(scenario, n):
+        username, client = rng.choice(sessions)
+        if scenario == 'index':
+            if args.no_cache:
+                main.dashboard_cache.clear()
+            return client.get('/').status_code
+        if scenario in ('toggle', 'delete'):
+            ids = task_ids.get(username)
+            if not ids:
+                return None
+            if scenario == 'toggle':
+                return client.post(f'/toggle/{rng.choice(ids)}').status_code
+            return client.get(f'/delete/{ids.pop()}').status_code
+        if scenario == 'login':
+            return main.app.test_client().post(
+                '/login', data={'username': username, 'password': PASSWORD}).status_code
+        if scenario == 'signup':
+            return main.app.test_client().post(
+                '/signup', data={'username': f'signup-{os.getpid()}-{n}-{time.time_ns()}',
+                                 'password': PASSWORD}).status_code
+
+    results = {}
+    for scenario in args.scenarios:
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for n in range(args.requests):
+            t0 = time.perf_counter()
+            status = request(scenario, n)
+            if status is None:
+                continue
+            latencies.append(time.perf_counter() - t0)
+            if status >= 400:
+                errors += 1
+        results[scenario] = summarize(latencies, errors, time.perf_counter() - started)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# HTTP mode (multi-process load against a running server)
+# ---------------------------------------------------------------------------
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Measure the request itself, not the dashboard it redirects to.
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _opener():
+    return urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+
+
+def _send(opener, url, data=None):
+    body = urllib.parse.urlencode(data).encode() if data is not None else None
+    try:
+        with opener.open(url, body, timeout=30) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as exc:
+        exc.read()
+        return exc.code
+    except OSError:
+        return 599
+
+
+def _http_worker(base_url, scenario, username, ids, count, seed, out):
+    rng = random.Random(seed)
+    opener = _opener()
+    _send(opener, base_url + '/login', {'username': username, 'password': PASSWORD})
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for n in range(count):
+        if scenario == 'index':
+            url, data = base_url + '/', None
+        elif scenario == 'toggle':
+            if not ids:
+                break
+            url, data = f'{base_url}/toggle/{rng.choice(ids)}', {}
+        elif scenario == 'delete':
+            if not ids:
+                break
+            url, data = f'{base_url}/delete/{ids.pop()}', None
+        elif scenario == 'login':
+            url, data = base_url + '/login', {'username': username, 'password': PASSWORD}
+        else:
+            url, data = base_url + '/signup', {
+                'username': f'signup-{os.getpid()}-{n}-{time.time_ns()}', 'password': PASSWORD}
+        t0 = time.perf_counter()
+        status = _send(_opener() if scenario in ('login', 'signup') else opener, url, data)
+        latencies.append(time.perf_counter() - t0)
+        if status >= 400:
+            errors += 1
+    out.put((latencies, errors, time.perf_counter() - started))
+
+
+def _session_cookie(base_url, username):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), _NoRedirect)
+    _send(opener, base_url + '/login', {'username': username, 'password': PASSWORD})
+    return '; '.join(f'{c.name}={c.value}' for c in jar)
+
+
+def open_idle_connections(base_url, username, count):
+    """Open ``count`` event streams for one user and leave them unread."""
+    url = urllib.parse.urlparse(base_url)
+    request = (f'GET /events HTTP/1.1\r\nHost: {url.netloc}\r\n'
+               f'Cookie: {_session_cookie(base_url, username)}\r\n'
+               'Accept: text/event-stream\r\n\r\n').encode()
+    sockets = []
+    for _ in range(count):
+        sock = socket.create_connection((url.hostname, url.port or 80), timeout=10)
+        sock.sendall(request)
+        sockets.append(sock)
+    return sockets
+
+
+def count_served(sockets):
+    """How many of the idle streams the server has actually answered."""
+    served = 0
+    for sock in sockets:
+        sock.setblocking(False)
+        try:
+            served += sock.recv(12).startswith(b'HTTP/1.1 200')
+        except BlockingIOError:
+            pass
+        except OSError:
+            continue
+    return served
+
+
+def run_http(args, task_ids):
+    usernames = sorted(task_ids)
+    rng = random.Random(args.seed)
+    results = {}
+    per_process = max(1, args.requests // args.processes)
+    for scenario in args.scenarios:
+        out = multiprocessing.Queue()
+        procs = []
+        for p in range(args.processes):
+            username = rng.choice(usernames)
+            ids = list(task_ids.get(username, []))
+            proc = multiprocessing.Process(
+                target=_http_worker,
+                args=(args.url, scenario, username, ids, per_process, args.seed + p, out))
+            proc.start()
+            procs.append(proc)
+        started = time.perf_counter()
+        latencies, errors = [], 0
+        for _ in procs:
+            lat, err, _elapsed = out.get()
+            latencies += lat
+            errors += err
+        elapsed = time.perf_counter() - started
+        for proc in procs:
+            proc.join()
+        results[scenario] = summarize(latencies, errors, elapsed)
+    return results
+
+
+def start_gunicorn(args, db_path):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.abspath(db_path),
+               SQLITE_MODE=args.sqlite_mode, SERVE_MODE=args.serve_mode,
+               WEB_PRELOAD='0' if args.no_preload else '1')
+    port = urllib.parse.urlparse(args.url).port or 8000
+    cmd = [sys.executable, '-m', 'gunicorn', 'main:create_app()', '--workers', str(args.workers),
+           '--bind', f'127.0.0.1:{port}'] + args.gunicorn_arg
+    proc = subprocess.Popen(cmd, cwd=HERE, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if _send(_opener(), args.url + '/status') == 200:
+            return proc
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError('gunicorn did not come up: ' + ' '.join(cmd))
+
+
+# ---------------------------------------------------------------------------
+# Startup mode
+# ---------------------------------------------------------------------------
+
+# Run in a fresh interpreter per sample, so imports and caches start cold.
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import main
+imported = time.perf_counter()
+main.create_app()
+created = time.perf_counter()
+client = main.app.test_client()
+client.get('/login')
+first = time.perf_counter()
+client.get('/login')
+second = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first_request': first - created, 'second_request': second - first}))
+"""
+
+
+def run_startup(args, db_path):
+    stages = {}
+    env = dict(os.environ, SQLITE_MODE=args.sqlite_mode)
+    for _ in range(args.startup_runs):
+        out = subprocess.check_output([sys.executable, '-c', STARTUP_PROBE, HERE], env=env, text=True)
+        for stage, seconds in json.loads(out.splitlines()[-1]).items():
+            stages.setdefault(stage, []).append(seconds)
+        if args.start_gunicorn:
+            started = time.perf_counter()
+            server = start_gunicorn(args, db_path)
+            stages.setdefault('gunicorn_up', []).append(time.perf_counter() - started)
+            server.terminate()
+            server.wait()
+    return {stage: summarize(values, 0, None) for stage, values in stages.items()}
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results, baseline=None):
+    print(f"{'scenario':<14} {'count':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'req/s':>9}")
+    for scenario, r in results.items():
+        line = (f"{scenario:<14} {r['count']:>6} {r['errors']:>4} {r['p50_ms'] or 0:>9.2f} "
+                f"{r['p95_ms'] or 0:>9.2f} {r['p99_ms'] or 0:>9.2f} {r['throughput_rps'] or 0:>9.1f}")
+        old = (baseline or {}).get(scenario)
+        if old and old.get('p50_ms') and r['p50_ms']:
+            line += f"   p50 {100 * (r['p50_ms'] / old['p50_ms'] - 1):+.1f}% vs baseline"
+        print(line)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='database file to seed (default: a temp file)')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--tasks-per-user', type=int, default=200,
+                        help='mean tasks per user')
+    parser.add_argument('--distribution', choices=('fixed', 'uniform', 'zipf'), default='zipf')
+    parser.add_argument('--days', type=int, default=90,
+                        help='spread due dates this many days around today')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma-separated subset of ' + ', '.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--sessions', type=int, default=10,
+                        help='logged-in users to spread test-client requests over')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='clear the dashboard cache before every index request')
+    parser.add_argument('--http', action='store_true', help='load a server over HTTP')
+    parser.add_argument('--url', default='http://127.0.0.1:8123')
+    parser.add_argument('--processes', type=int, default=4, help='HTTP load processes')
+    parser.add_argument('--start-gunicorn', action='store_true')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--sqlite-mode', default='production')
+    parser.add_argument('--serve-mode', choices=('threads', 'gevent'), default='threads',
+                        help='gunicorn worker type (see gunicorn.conf.py)')
+    parser.add_argument('--idle-connections', type=int, default=0,
+                        help='event streams to hold open during HTTP scenarios')
+    parser.add_argument('--gunicorn-arg', action='append', default=[],
+                        help='extra argument passed to gunicorn (repeatable)')
+    parser.add_argument('--no-preload', action='store_true',
+                        help='start gunicorn without --preload (WEB_PRELOAD=0)')
+    parser.add_argument('--startup', action='store_true',
+                        help='time cold starts instead of running the scenarios')
+    parser.add_argument('--startup-runs', type=int, default=5)
+    parser.add_argument('--shards', type=int, default=0,
+                        help='spread users over this many shard files next to --db')
+    parser.add_argument('--output', help='results file (default: bench-results/<stamp>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args(argv)
+    args.scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error('unknown scenarios: ' + ', '.join(sorted(unknown)))
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='taskbench-'), 'bench.db')
+    for path in [db_path] + shard_paths(db_path, args.shards):
+        if os.path.exists(path):
+            os.remove(path)
+    seeded = seed(db_path, args)
+    task_ids = task_ids_by_user(db_path, args.shards)
+
+    server = None
+    idle = []
+    idle_report = None
+    try:
+        if args.startup:
+            results = run_startup(args, db_path)
+        elif args.http:
+            if args.start_gunicorn:
+                server = start_gunicorn(args, db_path)
+            if args.idle_connections:
+                idle = open_idle_connections(args.url, sorted(task_ids)[0], args.idle_connections)
+            results = run_http(args, task_ids)
+            if idle:
+                idle_report = {'opened': len(idle), 'served': count_served(idle)}
+                print(f"idle event streams: {idle_report['served']}/{len(idle)} served")
+        else:
+            results = run_test_client(args, task_ids)
+    finally:
+        for sock in idle:
+            sock.close()
+        if server:
+            server.terminate()
+            server.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_table(results, baseline)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mode': 'startup' if args.startup else 'http' if args.http else 'test-client',
+            'seeded': seeded,
+            'idle_connections': idle_report,
+            'args': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        HERE, 'bench-results', datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('results written to', output)
+    return report
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,65 @@
+"""gzip/brotli compression of responses.
+
+``init_app`` compresses buffered text responses (HTML, JSON, CSS, JS, CSV)
+of at least ``COMPRESS_MIN_BYTES`` for clients that accept it; smaller
+bodies are not worth the CPU or the header.  Streamed responses (exports,
+``/events``) are left alone so each chunk still goes out as soon as it is
+produced.  Brotli is used when the optional ``brotli`` package is installed
+and the client asks for it, gzip otherwise.
+"""
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone still works
+    brotli = None
+
+COMPRESSIBLE = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'application/x-ndjson', 'image/svg+xml',
+}
+
+# Responses are compressed per request, so favour speed; static assets are
+# compressed once at startup and can afford the slowest, smallest settings.
+DYNAMIC_LEVELS = {'br': 5, 'gzip': 6}
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+
+
+def encodings():
+    """Encodings this process can produce, best first."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings, available=None):
+    for encoding in encodings():
+        if accept_encodings.quality(encoding) > 0 and (available is None or encoding in available):
+            return encoding
+    return None
+
+
+def compress(data, encoding, levels=DYNAMIC_LEVELS):
+    if encoding == 'br':
+        return brotli.compress(data, quality=levels['br'])
+    # mtime=0 keeps the output identical for identical input.
+    return gzip.compress(data, compresslevel=levels['gzip'], mtime=0)
+
+
+def init_app(app):
+    min_size = app.config.get('COMPRESS_MIN_BYTES', 1024)
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None or response.calculate_content_length() < min_size:
+            return response
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
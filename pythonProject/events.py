@@ -0,0 +1,71 @@
+"""In-process publish/subscribe for live task updates.
+
+Each open dashboard holds a :class:`Subscription` for its user, and the
+routes that change tasks publish to every subscription of that user.  The
+broker lives in one worker process only: streams are expected to notice
+changes made by other workers through ``User.data_version`` (see the
+``/events`` route), since every event carries the version it produced.
+"""
+import threading
+from collections import defaultdict, deque
+
+
+# Sent in place of events a subscriber missed; it should reload its state.
+STALE = {'type': 'stale'}
+
+
+class Subscription:
+    """A bounded inbox.  When a subscriber falls behind, its backlog is
+    replaced by a single STALE event instead of slowing down publishers."""
+
+    def __init__(self, user_id, max_pending):
+        self.user_id = user_id
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._ready = threading.Condition()
+
+    def put(self, event):
+        with self._ready:
+            if len(self._pending) >= self.max_pending:
+                self._pending.clear()
+                event = STALE
+            self._pending.append(event)
+            self._ready.notify()
+
+    def get(self, timeout):
+        """Return the next event, or None if nothing arrived within ``timeout``."""
+        with self._ready:
+            if not self._pending:
+                self._ready.wait(timeout)
+            return self._pending.popleft() if self._pending else None
+
+
+class Broker:
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, self.max_pending)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscriptions.values())
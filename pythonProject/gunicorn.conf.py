@@ -0,0 +1,43 @@
+"""Gunicorn settings; loaded automatically when gunicorn starts in this directory.
+
+``SERVE_MODE`` picks the worker type:
+
+* ``threads`` (default): gthread workers with ``WEB_THREADS`` threads each.
+  Every open connection, including an idle ``/events`` stream, holds a thread.
+* ``gevent``: one greenlet per connection, up to ``GEVENT_CONNECTIONS`` per
+  worker, so thousands of mostly idle streams fit in a single worker.
+
+The worker count comes from ``WEB_CONCURRENCY`` (gunicorn's own default) or
+``--workers``.
+
+The app is preloaded (``WEB_PRELOAD=0`` turns it off): the master imports it
+and runs ``create_app()`` once, and workers forked from it start with the
+modules, compiled templates and compressed assets already in memory, shared
+copy-on-write instead of rebuilt per worker.
+"""
+import gc
+import os
+
+serve_mode = os.environ.get('SERVE_MODE', 'threads')
+preload_app = os.environ.get('WEB_PRELOAD', '1') != '0'
+
+if serve_mode == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GEVENT_CONNECTIONS', 2000))
+    if preload_app:
+        # The app is imported before the workers patch themselves, so patch
+        # here: locks, queues and sockets created at import must be gevent's.
+        from gevent import monkey
+        monkey.patch_all()
+elif serve_mode == 'threads':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('WEB_THREADS', 8))
+else:
+    raise RuntimeError(f'SERVE_MODE must be "threads" or "gevent", not {serve_mode!r}')
+
+
+def when_ready(server):
+    if preload_app:
+        # Keep the preloaded objects out of the collector's generations, so
+        # collections in the workers don't write to (and copy) their pages.
+        gc.freeze()
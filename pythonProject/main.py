@@ -1,23 +1,176 @@
-from flask import Flask, render_template_string, request, redirect, flash
-from datetime import datetime
-import random
-from collections import defaultdict
+from flask import Flask, render_template, request, redirect, flash, make_response, jsonify, abort, session, \
+    stream_with_context, has_request_context
+import functools
+from functools import wraps
+import click
+import hmac
+from jinja2 import DictLoader, FileSystemBytecodeCache
+from datetime import datetime, date, time as dt_time, timedelta
+import json
+from calendar import Calendar
+from collections import defaultdict, namedtuple
+from contextlib import ExitStack
 import os
-from flask_sqlalchemy import SQLAlchemy
+import socket
+import tempfile
+import time
+from sqlalchemy.dialects import postgresql, sqlite
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import  check_password_hash
-
-from werkzeug.security import generate_password_hash
+from werkzeug.exceptions import TooManyRequests
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from cache import LRUCache
+import assets
+import background
+import backup
+import compression
+import events
+import metrics
+import migrate
+import passwords
+import postgres_mode
+import recurrence
+import search
+import serving
+import shards
+import sqlite_mode
+import transfer
+from suggestions import engine as suggestion_engine
 
 app = Flask(__name__)
 
-db = SQLAlchemy()
+router = shards.ShardRouter()
+db = shards.ShardedSQLAlchemy(router)
 login_manager = LoginManager()
 
 app.config['SECRET_KEY'] = 'your-secret-key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tasks.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = postgres_mode.database_url(
+    os.environ.get('DATABASE_URL', 'sqlite:///tasks.db'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['DASHBOARD_DAYS_PER_PAGE'] = int(os.environ.get('DASHBOARD_DAYS_PER_PAGE', 14))
+app.config['DASHBOARD_CACHE_SIZE'] = int(os.environ.get('DASHBOARD_CACHE_SIZE', 512))
+# Rows the dashboard query fetches from the cursor at a time.
+app.config['DASHBOARD_BATCH_SIZE'] = int(os.environ.get('DASHBOARD_BATCH_SIZE', 500))
+app.config['API_MAX_BATCH'] = int(os.environ.get('API_MAX_BATCH', 1000))
+
+# SQLITE_MODE=production turns on WAL and friends (see sqlite_mode.py); the
+# default leaves SQLite exactly as it comes, which is fine for local use.
+app.config['SQLITE_MODE'] = os.environ.get('SQLITE_MODE', 'default')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_CACHE_KB'] = int(os.environ.get('SQLITE_CACHE_KB', 20000))
+app.config['SQLITE_MMAP_BYTES'] = int(os.environ.get('SQLITE_MMAP_BYTES', 256 * 1024 * 1024))
+# Under gevent many more requests are in flight per worker; they wait for a
+# pooled connection cooperatively instead of each opening their own.
+app.config['SQLITE_POOL_SIZE'] = int(os.environ.get('SQLITE_POOL_SIZE', 20 if serving.using_gevent() else 5))
+app.config['SQLITE_POOL_OVERFLOW'] = int(os.environ.get('SQLITE_POOL_OVERFLOW', 10))
+app.config['SQLITE_POOL_TIMEOUT'] = float(os.environ.get('SQLITE_POOL_TIMEOUT', 30))
+app.config['SQLITE_WRITE_QUEUE'] = os.environ.get('SQLITE_WRITE_QUEUE', '1') == '1'
+app.config['SQLITE_WRITE_BATCH'] = int(os.environ.get('SQLITE_WRITE_BATCH', 64))
+app.config['SQLITE_WRITE_DELAY_MS'] = float(os.environ.get('SQLITE_WRITE_DELAY_MS', 2))
+# A postgresql:// DATABASE_URL gets a pooled engine (see postgres_mode.py).
+# PG_STATEMENT_TIMEOUT_MS=0 lifts the timeout; behind PgBouncer in
+# transaction mode set PG_PREPARED_STATEMENTS=0.
+app.config['PG_POOL_SIZE'] = int(os.environ.get('PG_POOL_SIZE', 20 if serving.using_gevent() else 5))
+app.config['PG_POOL_OVERFLOW'] = int(os.environ.get('PG_POOL_OVERFLOW', 10))
+app.config['PG_POOL_TIMEOUT'] = float(os.environ.get('PG_POOL_TIMEOUT', 30))
+app.config['PG_POOL_RECYCLE'] = int(os.environ.get('PG_POOL_RECYCLE', 1800))
+app.config['PG_POOL_PRE_PING'] = os.environ.get('PG_POOL_PRE_PING', '1') == '1'
+app.config['PG_STATEMENT_TIMEOUT_MS'] = int(os.environ.get('PG_STATEMENT_TIMEOUT_MS', 10000))
+app.config['PG_PREPARED_STATEMENTS'] = os.environ.get('PG_PREPARED_STATEMENTS', '1') == '1'
+app.config['PG_BATCH_PAGE_SIZE'] = int(os.environ.get('PG_BATCH_PAGE_SIZE', 1000))
+# Password hashing runs in a per-worker process pool; HASH_WORKERS=0 hashes
+# inline.  Past HASH_QUEUE_DEPTH queued or running hashes, requests get 429.
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+app.config['HASH_WORKERS'] = int(os.environ.get('HASH_WORKERS', 2))
+app.config['HASH_QUEUE_DEPTH'] = int(os.environ.get('HASH_QUEUE_DEPTH', 8))
+app.config['HASH_TIMEOUT'] = float(os.environ.get('HASH_TIMEOUT', 10))
+# Login attempts per minute (and burst) per username and per client IP.
+app.config['LOGIN_RATE_PER_USER'] = float(os.environ.get('LOGIN_RATE_PER_USER', 10))
+app.config['LOGIN_BURST_PER_USER'] = int(os.environ.get('LOGIN_BURST_PER_USER', 5))
+app.config['LOGIN_RATE_PER_IP'] = float(os.environ.get('LOGIN_RATE_PER_IP', 60))
+app.config['LOGIN_BURST_PER_IP'] = int(os.environ.get('LOGIN_BURST_PER_IP', 20))
+# Number of proxies in front of the app whose X-Forwarded-For to trust.
+app.config['PROXY_FIX_X_FOR'] = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+# Authenticated requests reuse a per-worker copy of the user row for this long.
+app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', 30))
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 10000))
+app.config['SEARCH_LIMIT'] = int(os.environ.get('SEARCH_LIMIT', 50))
+app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+app.config['IMPORT_CHUNK_SIZE'] = int(os.environ.get('IMPORT_CHUNK_SIZE', 500))
+app.config['IMPORT_MAX_ERRORS'] = int(os.environ.get('IMPORT_MAX_ERRORS', 100))
+app.config['EVENTS_HEARTBEAT'] = float(os.environ.get('EVENTS_HEARTBEAT', 15))
+app.config['EVENTS_MAX_AGE'] = float(os.environ.get('EVENTS_MAX_AGE', 300))
+app.config['EVENTS_MAX_PENDING'] = int(os.environ.get('EVENTS_MAX_PENDING', 100))
+app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+# Completed tasks move to the archive this many days after their due date,
+# open ones this many days overdue (0 keeps open tasks live forever).
+app.config['ARCHIVE_COMPLETED_DAYS'] = int(os.environ.get('ARCHIVE_COMPLETED_DAYS', 30))
+app.config['ARCHIVE_OVERDUE_DAYS'] = int(os.environ.get('ARCHIVE_OVERDUE_DAYS', 180))
+app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+# Seconds between archive runs; 0 leaves it to `flask archive-tasks`.
+app.config['ARCHIVE_INTERVAL'] = float(os.environ.get('ARCHIVE_INTERVAL', 3600))
+app.config['HISTORY_PAGE_SIZE'] = int(os.environ.get('HISTORY_PAGE_SIZE', 50))
+# Recurring tasks are never materialised further ahead than this.
+app.config['RECURRING_MAX_DAYS'] = int(os.environ.get('RECURRING_MAX_DAYS', 366))
+# Reminders fire this long before a task is due (its time, or the default
+# time for tasks without one); the planner looks REMINDER_INTERVAL seconds
+# ahead and catches up on ones missed within REMINDER_GRACE_MINUTES.
+app.config['REMINDER_LEAD_MINUTES'] = int(os.environ.get('REMINDER_LEAD_MINUTES', 15))
+app.config['REMINDER_DEFAULT_TIME'] = dt_time.fromisoformat(os.environ.get('REMINDER_DEFAULT_TIME', '09:00'))
+app.config['REMINDER_INTERVAL'] = float(os.environ.get('REMINDER_INTERVAL', 60))
+app.config['REMINDER_GRACE_MINUTES'] = int(os.environ.get('REMINDER_GRACE_MINUTES', 60))
+# Only the worker holding the scheduler lease runs background jobs; it renews
+# every LEASE_RENEW seconds and another worker takes over LEASE_TTL after it stops.
+app.config['LEASE_TTL'] = float(os.environ.get('LEASE_TTL', 30))
+app.config['LEASE_RENEW'] = float(os.environ.get('LEASE_RENEW', 10))
+app.config['SLOW_REQUEST_MS'] = float(os.environ.get('SLOW_REQUEST_MS', 0))
+# /metrics is open unless a token is configured.
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['BACKUP_DIR'] = os.environ.get('BACKUP_DIR', os.path.join(app.root_path, 'backups'))
+# POST /admin/backup is disabled unless a token is configured.
+app.config['BACKUP_TOKEN'] = os.environ.get('BACKUP_TOKEN')
+# Spread users' tasks over this many SQLite files (see shards.py); 0 keeps
+# everything in DATABASE_URL.  {n} in the URL is the shard number.
+app.config['SHARD_COUNT'] = int(os.environ.get('SHARD_COUNT', 0))
+app.config['SHARD_DATABASE_URL'] = os.environ.get('SHARD_DATABASE_URL', 'sqlite:///tasks-shard{n}.db')
+app.config['REBALANCE_PAUSE'] = float(os.environ.get('REBALANCE_PAUSE', 0.05))
+SQLITE_PRODUCTION = (app.config['SQLITE_MODE'] == 'production'
+                     and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'))
+if SQLITE_PRODUCTION:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_mode.engine_options(app.config)
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = postgres_mode.engine_options(app.config)
+    if serving.using_gevent():
+        postgres_mode.cooperative_waits()
+
+# Compressed static assets are kept here between processes (see assets.py).
+app.config['ASSET_CACHE_DIR'] = os.environ.get(
+    'ASSET_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'task-manager-assets'))
+
+# Compiled templates are cached on disk so new gunicorn workers can skip
+# Jinja's parse/compile step; set JINJA_BYTECODE_CACHE_DIR to share a location.
+app.jinja_options = {
+    **app.jinja_options,
+    'bytecode_cache': FileSystemBytecodeCache(os.environ.get('JINJA_BYTECODE_CACHE_DIR')),
+}
+
+if app.config['PROXY_FIX_X_FOR']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
+asset_manifest = assets.AssetManifest(os.path.join(app.root_path, 'static'),
+                                      cache_dir=app.config['ASSET_CACHE_DIR'])
+asset_manifest.init_app(app)
 
+password_hasher = passwords.PasswordHasher(
+    app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['HASH_WORKERS'],
+    queue_depth=app.config['HASH_QUEUE_DEPTH'],
+    timeout=app.config['HASH_TIMEOUT'],
+)
+user_login_limiter = passwords.RateLimiter(app.config['LOGIN_RATE_PER_USER'],
+                                           app.config['LOGIN_BURST_PER_USER'])
+ip_login_limiter = passwords.RateLimiter(app.config['LOGIN_RATE_PER_IP'],
+                                         app.config['LOGIN_BURST_PER_IP'])
 
 db.init_app(app)
 login_manager.init_app(app)
@@ -28,48 +181,323 @@ class User(db.Model, UserMixin):
     username = db.Column(db.String(150), unique=True, nullable=False)
     password = db.Column(db.String(150), nullable=False)
     description = db.Column(db.String(500), default='')  # 🆕 New field
+    # Bumped on every write to the user's tasks or profile; cached pages and
+    # ETags are keyed on it.
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Where the user's tasks live (shards.py); NULL is this database.
+    shard = db.Column(db.SmallInteger)
     tasks = db.relationship('Task', backref='user', lazy=True)
 
 
-class Task(db.Model):
+# Priorities are stored as small integers so they sort and index cheaply;
+# the names are only used at the form/template boundary.
+PRIORITY_LOW, PRIORITY_MEDIUM, PRIORITY_HIGH = 1, 2, 3
+PRIORITY_NAMES = {PRIORITY_LOW: 'Low', PRIORITY_MEDIUM: 'Medium', PRIORITY_HIGH: 'High'}
+PRIORITY_LEVELS = {name: level for level, name in PRIORITY_NAMES.items()}
+
+
+class TaskMixin:
+    __slots__ = ()
+
+    @property
+    def priority_name(self):
+        return PRIORITY_NAMES.get(self.priority, '')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'text': self.text,
+            'priority': self.priority_name,
+            'due_date': self.due_date and self.due_date.isoformat(),
+            'completed': bool(self.completed),
+            'time': self.time and self.time.isoformat(),
+        }
+
+
+class Task(TaskMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    text = db.Column(db.String(200), nullable=False)
+    priority = db.Column(db.SmallInteger)
+    due_date = db.Column(db.Date)
+    completed = db.Column(db.Boolean, default=False)
+    time = db.Column(db.Time)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    # Set on occurrences materialised from a RecurringRule.
+    rule_id = db.Column(db.Integer, db.ForeignKey('recurring_rule.id'))
+
+    # The dashboard reads one user's tasks grouped by date and ordered by
+    # completion then time, so this index covers both the filter and the sort.
+    # The reminder planner looks up open tasks by due date across all users.
+    __table_args__ = (
+        db.Index('ix_task_user_due_completed', 'user_id', 'due_date', 'completed', 'time'),
+        db.Index('ix_task_user_completed_priority', 'user_id', 'completed', 'priority'),
+        db.Index('ix_task_open_due', 'due_date', sqlite_where=db.text('completed = 0'),
+                 postgresql_where=db.text('NOT completed')),
+    )
+
+
+class TaskRow(TaskMixin, namedtuple('TaskRow', 'id text priority due_date completed time rule_id')):
+    """A task as the dashboard reads it: a plain tuple of the columns the
+    page shows, with none of the ORM's per-object state or session tracking.
+    Read-only; writes still go through ``Task``."""
+    __slots__ = ()
+
+
+class ArchivedTask(TaskMixin, db.Model):
+    """Tasks moved out of ``task`` by archive_tasks once they are long done or
+    long overdue, so the dashboard's table and indexes hold only live work.
+    Rows are read only by the history page.  ``task_id`` is the id the
+    task had, which SQLite may hand out again once the row is gone."""
     id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer)
     text = db.Column(db.String(200), nullable=False)
-    priority = db.Column(db.String(20))
-    due_date = db.Column(db.String(50))
+    priority = db.Column(db.SmallInteger)
+    due_date = db.Column(db.Date)
     completed = db.Column(db.Boolean, default=False)
-    time = db.Column(db.String(20))
+    time = db.Column(db.Time)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+    # History pages walk one user's archive newest due date first.
+    __table_args__ = (
+        db.Index('ix_archived_task_user_due', 'user_id', 'due_date', 'id'),
+    )
+
+
+class RecurringRule(db.Model):
+    """A task that repeats on one of recurrence.PATTERNS.  Occurrences are
+    written as ordinary tasks only once the dashboard reaches their dates
+    (see expand_recurring); ``materialized_until`` is the last day done."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    text = db.Column(db.String(200), nullable=False)
+    priority = db.Column(db.SmallInteger)
+    time = db.Column(db.Time)
+    pattern = db.Column(db.String(10), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date)
+    materialized_until = db.Column(db.Date)
+
+    @property
+    def priority_name(self):
+        return PRIORITY_NAMES.get(self.priority, '')
+
+    @property
+    def label(self):
+        return recurrence.LABELS[self.pattern]
+
+
+class Reminder(db.Model):
+    """Outbox of reminders the scheduler has fired, for a delivery channel
+    (the dashboard, a mail or push sender) to pick up and acknowledge."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    task_id = db.Column(db.Integer, nullable=False)
+    text = db.Column(db.String(200), nullable=False)
+    remind_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    delivered_at = db.Column(db.DateTime)
+
+    # One reminder per task and time, whichever worker fires it.
+    __table_args__ = (
+        db.UniqueConstraint('task_id', 'remind_at', name='uq_reminder_task_time'),
+        db.Index('ix_reminder_user_delivered', 'user_id', 'delivered_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'task_id': self.task_id,
+            'text': self.text,
+            'remind_at': self.remind_at.isoformat(),
+        }
+
+
+class Lease(db.Model):
+    """A named lock with an expiry, held by one worker at a time."""
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class DailySummary(db.Model):
+    """Task counts per user, due date and priority, kept in step by every
+    task write (see update_daily_summary) so summaries read O(days) rows
+    instead of scanning tasks.  ``flask rebuild-summaries`` recomputes it."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    # 0 for legacy tasks without a priority
+    priority = db.Column(db.SmallInteger, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Everything that belongs to one user, in the order rows can be copied
+# without breaking foreign keys; these tables live on the user's shard.
+SHARDED_MODELS = (RecurringRule, Task, ArchivedTask, Reminder, DailySummary)
+
+
+def current_user_shard():
+    if has_request_context() and current_user.is_authenticated:
+        return current_user.shard
+    return shards.MAIN
+
+
+router.init_app(
+    app, db, app.config['SHARD_COUNT'], app.config['SHARD_DATABASE_URL'],
+    tables=[model.__tablename__ for model in SHARDED_MODELS],
+    default=current_user_shard,
+)
+
+
+# What every login check, dashboard view and toggle runs; on PostgreSQL
+# these are prepared once per connection (see postgres_mode.py).
+prepared = postgres_mode.PreparedStatements(enabled=app.config['PG_PREPARED_STATEMENTS'])
+
+
+def _prepare_statements():
+    users, tasks, summary = User.__table__, Task.__table__, DailySummary.__table__
+    user_id = db.bindparam('user_id')
+    prepared.add('load_user', db.select(
+        users.c.id, users.c.username, users.c.description, users.c.data_version, users.c.shard,
+    ).where(users.c.id == user_id))
+    prepared.add('data_version', db.select(users.c.data_version).where(
+        users.c.id == user_id, users.c.shard.is_(None)))
+    prepared.add('data_version_on_shard', db.select(users.c.data_version).where(
+        users.c.id == user_id, users.c.shard == db.bindparam('shard')))
+    due_today = db.case((summary.c.day == db.bindparam('today'), 1), else_=0)
+    prepared.add('task_summary', db.select(
+        summary.c.priority,
+        db.func.sum(summary.c.total),
+        db.func.sum(summary.c.completed),
+        db.func.sum(summary.c.total * due_today),
+        db.func.sum(summary.c.completed * due_today),
+    ).where(summary.c.user_id == user_id).group_by(summary.c.priority))
+    # UPDATE reserves bind names that match its table's columns.
+    owned = db.and_(tasks.c.id == db.bindparam('b_task_id'), tasks.c.user_id == db.bindparam('b_user_id'))
+    prepared.add('toggle_task', tasks.update().where(owned).values(completed=db.not_(tasks.c.completed)))
+    prepared.add('owned_task', tasks.select().where(owned))
+
+
+_prepare_statements()
+
+
+def execute_prepared(name, **params):
+    """Run a ``prepared`` statement on the request session's connection for it."""
+    conn = db.session.connection(bind_arguments={'clause': prepared[name]})
+    return prepared.execute(conn, name, params)
+
+
+class SessionUser(UserMixin):
+    """The fields requests need from a user, cached instead of a full ORM row."""
+
+    __slots__ = ('id', 'username', 'description', 'data_version', 'shard')
+
+    def __init__(self, id, username, description, data_version, shard):
+        self.id = id
+        self.username = username
+        self.description = description
+        self.data_version = data_version
+        self.shard = shard
+
+
+user_cache = LRUCache(app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    # The session remembers the lowest data_version this browser may see, so
+    # after its own writes no worker serves it an older cached copy.
+    cached = user_cache.get(user_id)
+    if cached is not None and cached.data_version >= session.get('user_version', 0):
+        return cached
+    row = execute_prepared('load_user', user_id=user_id).first()
+    if row is None:
+        user_cache.pop(user_id)
+        return None
+    user = SessionUser(*row)
+    if user.shard is not shards.MAIN:
+        # The data_version that counts is the one next to the tasks.
+        try:
+            user.data_version = data_version_of(router.connection(user.shard), user_id)
+        except shards.UserMoved:
+            # Signed up but the stub row never made it to the shard.
+            ensure_shard_user(user_id, user.shard)
+            user.data_version = 0
+    user_cache.set(user_id, user)
+    return user
+
+
+def user_changed(user_id, version=None):
+    """Drop cached copies of a user after a write to their row or tasks.
+
+    ``version`` is the data_version the write committed (what
+    bump_data_version returned); the writer's session then refuses cached
+    copies older than that on every worker.
+    """
+    user_cache.pop(user_id)
+    if version is not None and current_user.is_authenticated and current_user.id == user_id:
+        session['user_version'] = max(version, session.get('user_version', 0))
+
+
+class TaskSummary:
+    """Per-user task counts the dashboard and suggestion rules work from."""
+
+    def __init__(self, counts=None, today_total=0, today_open=0):
+        # counts maps (priority name, completed) -> number of tasks
+        self.counts = counts or {}
+        self.today_total = today_total
+        self.today_open = today_open
+
+    def open_count(self, priority):
+        return self.counts.get((priority, False), 0)
+
+    def signature(self):
+        return (tuple(sorted(self.counts.items(), key=repr)), self.today_total, self.today_open)
+
+
+def task_summary(user_id, today=None):
+    """Summarise a user's tasks from their DailySummary rows (one per day
+    and priority), so the cost grows with days used rather than tasks."""
+    today = today or date.today()
+    rows = execute_prepared('task_summary', user_id=user_id, today=today)
+    summary = TaskSummary()
+    for priority, total, completed, total_today, completed_today in rows:
+        name = PRIORITY_NAMES.get(priority, '')
+        for done, count in ((True, completed), (False, total - completed)):
+            if count:
+                summary.counts[(name, done)] = summary.counts.get((name, done), 0) + count
+        summary.today_total += total_today
+        summary.today_open += total_today - completed_today
+    return summary
+
+
+def day_counts(user_id, start, end, archived=False):
+    """{day: (total, completed)} for the days between start and end inclusive.
+
+    DailySummary covers live tasks only; ``archived`` adds the archived ones,
+    counted straight from ArchivedTask's (user_id, due_date) index.
+    """
+    rows = db.session.query(
+        DailySummary.day,
+        db.func.sum(DailySummary.total),
+        db.func.sum(DailySummary.completed),
+    ).filter(DailySummary.user_id == user_id, DailySummary.day.between(start, end)) \
+        .group_by(DailySummary.day)
+    counts = {day: (total, completed) for day, total, completed in rows}
+    if archived:
+        rows = db.session.query(
+            ArchivedTask.due_date,
+            db.func.count(),
+            db.func.sum(db.case((ArchivedTask.completed, 1), else_=0)),
+        ).filter(ArchivedTask.user_id == user_id, ArchivedTask.due_date.between(start, end)) \
+            .group_by(ArchivedTask.due_date)
+        for day, total, completed in rows:
+            live_total, live_completed = counts.get(day, (0, 0))
+            counts[day] = (live_total + total, live_completed + completed)
+    return counts
 
-def suggest_tasks():
-    now = datetime.now()
-    weekday = now.strftime('%A')
-    hour = now.hour
-    suggestions = []
-    if not current_user.is_authenticated:
-        return suggestions
-    tasks = Task.query.filter_by(user_id=current_user.id).all()
-    if weekday == 'Monday': suggestions.append("Plan weekly goals")
-    if weekday == 'Friday': suggestions.append("Review weekly progress")
-    if hour < 10: suggestions.append("Prioritize today's tasks")
-    if any(t.priority == 'High' and not t.completed for t in tasks):
-        suggestions.append("Focus on urgent tasks")
-    suggestions += random.sample([
-        "Review your top 3 priorities for the day",
-        "Clear out 5 old emails from your inbox",
-        "Drink a glass of water 💧",
-        "Take a 5-minute deep breathing break 🧘",
-        "Organize your files into folders",
-        "Check your calendar for upcoming events",
-        "Reflect on what went well yesterday",
-        "Watch a short TED Talk",
-        "Listen to your favorite upbeat song 🎵",
-        "Check your tasks marked as 'High'",
-    ], k=2)
-    return suggestions
 
 LOGIN_HTML = '''
 <!DOCTYPE html>
@@ -77,31 +505,11 @@ LOGIN_HTML = '''
 <head>
     <meta charset="UTF-8">
     <title>Login - AutoDeployX</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    <style>
-        body {
-            background: linear-gradient(to right, #e3f2fd, #e8f5e9);
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            height: 100vh;
-        }
-        .login-box {
-            background: #fff;
-            padding: 40px;
-            border-radius: 12px;
-            box-shadow: 0 0 15px rgba(0,0,0,0.1);
-            width: 100%;
-            max-width: 400px;
-        }
-        h2 {
-            font-weight: 600;
-            margin-bottom: 25px;
-        }
-    </style>
+    <link href="{{ asset_url('vendor/bootstrap-5.3.0.min.css') }}" rel="stylesheet">
+    <link href="{{ asset_url('css/app.css') }}" rel="stylesheet">
 </head>
-<body>
-    <div class="login-box">
+<body class="auth-page login">
+    <div class="auth-box">
         <h2 class="text-center">🔐 Welcome to AutoDeployX</h2>
 
         {% with messages = get_flashed_messages() %}
@@ -140,18 +548,7 @@ LOGIN_HTML = '''
         </p>
     </div>
 
-<script>
-function togglePassword(fieldId, iconElement) {
-    const input = document.getElementById(fieldId);
-    if (input.type === "password") {
-        input.type = "text";
-        iconElement.textContent = "🙈";
-    } else {
-        input.type = "password";
-        iconElement.textContent = "👁️";
-    }
-}
-</script>
+<script src="{{ asset_url('js/app.js') }}"></script>
 
 </body>
 </html>
@@ -165,31 +562,11 @@ SIGNUP_HTML = '''
 <head>
     <meta charset="UTF-8">
     <title>Sign Up - AutoDeployX</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    <style>
-        body {
-            background: linear-gradient(to right, #fff3e0, #e1f5fe);
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            height: 100vh;
-        }
-        .signup-box {
-            background: #fff;
-            padding: 40px;
-            border-radius: 12px;
-            box-shadow: 0 0 15px rgba(0,0,0,0.1);
-            width: 100%;
-            max-width: 400px;
-        }
-        h2 {
-            font-weight: 600;
-            margin-bottom: 25px;
-        }
-    </style>
+    <link href="{{ asset_url('vendor/bootstrap-5.3.0.min.css') }}" rel="stylesheet">
+    <link href="{{ asset_url('css/app.css') }}" rel="stylesheet">
 </head>
-<body>
-    <div class="signup-box">
+<body class="auth-page signup">
+    <div class="auth-box">
         <h2 class="text-center">🚀 Join AutoDeployX</h2>
         <form method="POST">
             <div class="mb-3">
@@ -200,17 +577,6 @@ SIGNUP_HTML = '''
     <span id="monkeyToggle" class="position-absolute top-50 end-0 translate-middle-y me-3" style="cursor:pointer; font-size: 20px;">🙈</span>
 </div>
 
-<script>
-    const monkeyToggle = document.getElementById("monkeyToggle");
-    const passwordInput = document.getElementById("passwordInput");
-
-    monkeyToggle.addEventListener("click", function () {
-        const isPassword = passwordInput.type === "password";
-        passwordInput.type = isPassword ? "text" : "password";
-        monkeyToggle.textContent = isPassword ? "🙉" : "🙈"; // Toggle monkey face
-    });
-</script>
-
 
             <div class="d-grid mb-3">
                 <button type="submit" class="btn btn-success">Sign Up</button>
@@ -218,6 +584,7 @@ SIGNUP_HTML = '''
         </form>
         <p class="text-center">Already have an account? <a href="/login">Log in</a></p>
     </div>
+<script src="{{ asset_url('js/app.js') }}"></script>
 </body>
 </html>
 '''
@@ -228,7 +595,8 @@ PROFILE_HTML = '''
 <html>
 <head>
     <title>Profile - AutoDeployX</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+    <link href="{{ asset_url('vendor/bootstrap-5.3.0.min.css') }}" rel="stylesheet">
+    <link href="{{ asset_url('css/app.css') }}" rel="stylesheet">
 </head>
 <body class="bg-light">
     <div class="container mt-5">
@@ -254,6 +622,13 @@ PROFILE_HTML = '''
                     <button class="btn btn-primary">💾 Save Changes</button>
                 </div>
             </form>
+            <hr>
+            <h5 class="mb-3">📦 Import / Export</h5>
+            <p class="mb-2">Download all tasks as <a href="/export?format=csv">CSV</a> or <a href="/export?format=jsonl">JSON Lines</a>.</p>
+            <form method="POST" action="/import" enctype="multipart/form-data" class="d-flex">
+                <input type="file" name="file" accept=".csv,.jsonl,.ndjson" class="form-control me-2" required>
+                <button class="btn btn-outline-primary">Import</button>
+            </form>
             <div class="text-center mt-3">
                 <a href="/" class="text-decoration-none">⬅️ Back to Home</a>
             </div>
@@ -271,35 +646,10 @@ HTML_TEMPLATE = '''
 <head>
     <meta charset="UTF-8">
     <title>AutoDeployX - Task Manager app atumated</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    <style>
-        body {
-            background: linear-gradient(to right, #e0f2f1, #f1f8e9);
-            font-family: 'Segoe UI', sans-serif;
-        }
-        .task-card {
-            background: white;
-            border-radius: 12px;
-            padding: 25px;
-            box-shadow: 0 0 15px rgba(0,0,0,0.08);
-        }
-        .sticky-header {
-            position: sticky;
-            top: 0;
-            z-index: 999;
-            background-color: #ffffff;
-            padding: 15px 0;
-            box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-        }
-        .logout-btn {
-            border-radius: 20px;
-            font-weight: 500;
-            padding: 6px 16px;
-            box-shadow: 0 2px 6px rgba(0,0,0,0.1);
-        }
-    </style>
+    <link href="{{ asset_url('vendor/bootstrap-5.3.0.min.css') }}" rel="stylesheet">
+    <link href="{{ asset_url('css/app.css') }}" rel="stylesheet">
 </head>
-<body>
+<body class="dashboard">
 <div class="container py-4">
 
     <!-- Header -->
@@ -313,7 +663,12 @@ HTML_TEMPLATE = '''
             <div class="text-muted small fst-italic">No description added</div>
         {% endif %}
     </div>
-    <a href="/logout" class="btn btn-danger btn-sm logout-btn me-3">🔓 Logout</a>
+    <div class="me-3">
+        <a href="/calendar" class="btn btn-outline-primary btn-sm logout-btn me-2">🗓️ Month</a>
+        <a href="/history" class="btn btn-outline-secondary btn-sm logout-btn me-2">📦 History</a>
+        <a href="/recurring" class="btn btn-outline-secondary btn-sm logout-btn me-2">🔁 Repeating</a>
+        <a href="/logout" class="btn btn-danger btn-sm logout-btn">🔓 Logout</a>
+    </div>
 </div>
 
     
@@ -335,7 +690,7 @@ HTML_TEMPLATE = '''
     <!-- Task Entry Form -->
     <div class="task-card mb-4">
         <form method="POST" class="row g-3 align-items-end">
-            <div class="col-md-5">
+            <div class="col-md-4">
                 <label class="form-label">📝 Task</label>
                 <input name="task" class="form-control" placeholder="Add a task..." required>
             </div>
@@ -348,10 +703,19 @@ HTML_TEMPLATE = '''
                     <option>Low</option>
                 </select>
             </div>
-            <div class="col-md-3">
+            <div class="col-md-2">
                 <label class="form-label">📆 Due Date</label>
                 <input type="date" name="due_date" class="form-control" required>
             </div>
+            <div class="col-md-2">
+                <label class="form-label">🔁 Repeat</label>
+                <select name="repeat" class="form-select">
+                    <option value="">Once</option>
+                    {% for pattern, label in repeat_labels.items() %}
+                    <option value="{{ pattern }}">{{ label }}</option>
+                    {% endfor %}
+                </select>
+            </div>
             <div class="col-md-2">
                 <button type="submit" class="btn btn-success w-100">➕ Add Task</button>
             </div>
@@ -373,109 +737,1371 @@ HTML_TEMPLATE = '''
         {% endif %}
     </div>
 
-    <!-- Filter Dropdown -->
-    <div class="mb-4 text-end">
-        <label for="priorityFilter" class="me-2 fw-semibold">🔍 Filter by Priority:</label>
-        <select id="priorityFilter" class="form-select d-inline-block w-auto">
-            <option value="all">All</option>
-            <option value="High">High</option>
-            <option value="Medium">Medium</option>
-            <option value="Low">Low</option>
-        </select>
-    </div>
+    <!-- Filters -->
+    <form method="GET" class="task-card mb-4 row g-2 align-items-end">
+        <div class="col-md-3">
+            <label for="priorityFilter" class="form-label fw-semibold">🔍 Priority</label>
+            <select id="priorityFilter" name="priority" class="form-select">
+                {% for value, label in [('all', 'All'), ('High', 'High'), ('Medium', 'Medium'), ('Low', 'Low')] %}
+                <option value="{{ value }}" {% if filters.priority == value %}selected{% endif %}>{{ label }}</option>
+                {% endfor %}
+            </select>
+        </div>
+        <div class="col-md-2">
+            <label class="form-label fw-semibold">✅ Status</label>
+            <select name="status" class="form-select">
+                {% for value, label in [('all', 'All'), ('open', 'Open'), ('done', 'Done')] %}
+                <option value="{{ value }}" {% if filters.status == value %}selected{% endif %}>{{ label }}</option>
+                {% endfor %}
+            </select>
+        </div>
+        <div class="col-md-3">
+            <label class="form-label fw-semibold">📆 From</label>
+            <input type="date" name="start" value="{{ filters.start or '' }}" class="form-control">
+        </div>
+        <div class="col-md-3">
+            <label class="form-label fw-semibold">📆 To</label>
+            <input type="date" name="end" value="{{ filters.end or '' }}" class="form-control">
+        </div>
+        <div class="col-md-1">
+            <button type="submit" class="btn btn-outline-primary w-100">Apply</button>
+        </div>
+    </form>
+
+    <!-- Search -->
+    <form method="GET" action="/search" class="mb-4 d-flex">
+        <input type="search" name="q" class="form-control me-2" placeholder="🔎 Search your tasks...">
+        <button type="submit" class="btn btn-outline-secondary">Search</button>
+    </form>
 
     <!-- Task List -->
-    {% for date, date_tasks in calendar.items() %}
-    <div class="task-card mb-4">
-        <h5 class="mb-3">📆 {{ date }}</h5>
-        <ul class="list-group">
-            {% for task in date_tasks %}
-            <li class="list-group-item d-flex justify-content-between align-items-center task-item" data-priority="{{ task.priority }}">
+    {% macro task_item(task) %}
+            <li class="list-group-item d-flex justify-content-between align-items-center task-item" data-id="{{ task.id }}" data-priority="{{ task.priority_name }}">
                 <div>
                     <form method="POST" action="/toggle/{{ task.id }}" style="display:inline;">
-                        <input type="checkbox" onchange="this.form.submit()" {% if task.completed %}checked{% endif %}>
+                        <input type="checkbox" onchange="if (!window.liveTasks) this.form.submit()" {% if task.completed %}checked{% endif %}>
                     </form>
-                    <span {% if task.completed %}style="text-decoration:line-through;"{% endif %}>
+                    <span class="task-text" {% if task.completed %}style="text-decoration:line-through;"{% endif %}>
                         {{ task.text }}
                     </span>
-                    <small class="text-muted">[{{ task.priority }} - {{ task.time }}]</small>
+                    <small class="text-muted task-meta">[{{ task.priority_name }} - {{ task.time }}]</small>
+                    {% if task.rule_id %}<small title="Repeating task">🔁</small>{% endif %}
                 </div>
-                <a href="/delete/{{ task.id }}" class="btn btn-sm btn-danger">🗑️ Delete</a>
+                <a href="/delete/{{ task.id }}" class="btn btn-sm btn-danger task-delete">🗑️ Delete</a>
             </li>
+    {% endmacro %}
+    <div id="stale-banner" class="alert alert-info text-center d-none">
+        Your tasks changed somewhere else. <a href="{{ url_for('index', **filters.query_args()) }}" class="alert-link">Reload</a>
+    </div>
+    <div id="task-list" data-version="{{ version }}" data-priority="{{ filters.priority }}" data-status="{{ filters.status }}">
+    {% for date, date_tasks in calendar.items() %}
+    <div class="task-card mb-4">
+        <h5 class="mb-3">📆 {{ date or 'No date' }}
+            {% if date in day_counts %}{% set total, done = day_counts[date] %}
+            <small class="text-muted day-count" data-date="{{ date }}" data-total="{{ total }}" data-done="{{ done }}">{{ done }}/{{ total }} done</small>
+            {% endif %}
+        </h5>
+        <ul class="list-group" data-date="{{ date }}">
+            {% for task in date_tasks %}
+            {{ task_item(task) }}
             {% endfor %}
         </ul>
     </div>
+    {% else %}
+    <p class="text-center text-muted">No tasks match these filters.</p>
     {% endfor %}
+    </div>
+    <template id="task-item-template">{{ task_item({'id': '', 'text': '', 'priority_name': '', 'time': ''}) }}</template>
+
+    <!-- Pagination -->
+    <div class="d-flex justify-content-between mb-4">
+        <div>
+        {% if next_before %}
+        <a href="{{ url_for('index', before=next_before, **filters.query_args()) }}" class="btn btn-outline-secondary btn-sm">⏪ Earlier dates</a>
+        {% endif %}
+        {% if filters.after or filters.before %}
+        <a href="{{ url_for('index', **filters.query_args()) }}" class="btn btn-outline-secondary btn-sm">Today</a>
+        {% endif %}
+        </div>
+        {% if next_after %}
+        <a href="{{ url_for('index', after=next_after, **filters.query_args()) }}" class="btn btn-outline-secondary btn-sm">Later dates ⏭</a>
+        {% endif %}
+    </div>
+
+</div>
+
+<script src="{{ asset_url('js/app.js') }}"></script>
+</body>
+</html>
+'''
+
+
+SEARCH_HTML = '''
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Search - AutoDeployX</title>
+    <link href="{{ asset_url('vendor/bootstrap-5.3.0.min.css') }}" rel="stylesheet">
+    <link href="{{ asset_url('css/app.css') }}" rel="stylesheet">
+</head>
+<body class="bg-light">
+<div class="container py-4" style="max-width: 800px;">
+    <a href="/" class="text-decoration-none">⬅️ Back to Home</a>
+    <form method="GET" class="d-flex my-3">
+        <input type="search" name="q" value="{{ q }}" class="form-control me-2" placeholder="🔎 Search your tasks..." autofocus>
+        <button type="submit" class="btn btn-primary">Search</button>
+    </form>
+    {% if not enabled %}
+    <div class="alert alert-warning">Search is not available on this server.</div>
+    {% elif q %}
+    <p class="text-muted">{{ results|length }} result{{ '' if results|length == 1 else 's' }}{% if results|length >= limit %} (showing the best {{ limit }}){% endif %}</p>
+    <ul class="list-group">
+        {% for task in results %}
+        <li class="list-group-item d-flex justify-content-between align-items-center">
+            <div>
+                <span {% if task.completed %}style="text-decoration:line-through;"{% endif %}>{{ task.text }}</span>
+                <small class="text-muted">[{{ task.priority_name }} - {{ task.due_date }}]</small>
+            </div>
+            <form method="POST" action="/toggle/{{ task.id }}">
+                <button class="btn btn-sm btn-outline-success">{{ 'Reopen' if task.completed else 'Done' }}</button>
+            </form>
+        </li>
+        {% endfor %}
+    </ul>
+    {% endif %}
+</div>
+</body>
+</html>
+'''
+
+
+CALENDAR_HTML = '''
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>{{ month.strftime('%B %Y') }} - AutoDeployX</title>
+    <link href="{{ asset_url('vendor/bootstrap-5.3.0.min.css') }}" rel="stylesheet">
+    <link href="{{ asset_url('css/app.css') }}" rel="stylesheet">
+</head>
+<body class="dashboard">
+<div class="container py-4" style="max-width: 800px;">
+    <a href="/" class="text-decoration-none">⬅️ Back to Home</a>
+    <div class="task-card my-3">
+        <div class="d-flex justify-content-between align-items-center mb-3">
+            <a href="/calendar?month={{ previous.strftime('%Y-%m') }}" class="btn btn-outline-secondary btn-sm">◀</a>
+            <h4 class="mb-0">🗓️ {{ month.strftime('%B %Y') }}</h4>
+            <a href="/calendar?month={{ following.strftime('%Y-%m') }}" class="btn btn-outline-secondary btn-sm">▶</a>
+        </div>
+        <table class="table table-borderless heatmap mb-0">
+            <thead>
+                <tr>{% for name in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'] %}<th class="text-center text-muted small">{{ name }}</th>{% endfor %}</tr>
+            </thead>
+            <tbody>
+                {% for week in weeks %}
+                <tr>
+                    {% for day, total, done, level in week %}
+                    <td class="heat-{{ level }}{% if day.month != month.month %} other-month{% endif %}{% if day == today %} today{% endif %}">
+                        <a href="/?start={{ day }}&end={{ day }}" class="d-block text-decoration-none text-reset">
+                            <div class="fw-semibold">{{ day.day }}</div>
+                            <div class="small">{% if total %}{{ done }}/{{ total }}{% if done == total %} ✅{% endif %}{% else %}&nbsp;{% endif %}</div>
+                        </a>
+                    </td>
+                    {% endfor %}
+                </tr>
+                {% endfor %}
+            </tbody>
+        </table>
+    </div>
+</div>
+</body>
+</html>
+'''
 
+
+HISTORY_HTML = '''
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>History - AutoDeployX</title>
+    <link href="{{ asset_url('vendor/bootstrap-5.3.0.min.css') }}" rel="stylesheet">
+    <link href="{{ asset_url('css/app.css') }}" rel="stylesheet">
+</head>
+<body class="bg-light">
+<div class="container py-4" style="max-width: 800px;">
+    <a href="/" class="text-decoration-none">⬅️ Back to Home</a>
+    <h4 class="my-3">📦 History</h4>
+    <p class="text-muted small">Tasks leave the dashboard {{ completed_days }} days after their due date once done{% if overdue_days %}, or {{ overdue_days }} days overdue if still open{% endif %}.</p>
+    {% macro history_item(task) -%}
+    <li class="list-group-item d-flex justify-content-between align-items-center">
+        <span class="task-text" {% if task.completed %}style="text-decoration:line-through;"{% endif %}>{{ task.text }}</span>
+        <small class="text-muted task-meta">[{{ task.priority_name }} - {{ task.due_date }}]</small>
+    </li>
+    {%- endmacro %}
+    <ul class="list-group mb-3" id="history-list">
+        {% for task in tasks %}
+        {{ history_item(task) }}
+        {% else %}
+        <li class="list-group-item text-muted">{{ 'No older tasks.' if before else 'Nothing archived yet.' }}</li>
+        {% endfor %}
+    </ul>
+    <template id="history-item-template">{{ history_item({'text': '', 'priority_name': '', 'due_date': ''}) }}</template>
+    <div class="d-flex justify-content-between mb-4">
+        {% if before %}
+        <a href="/history" class="btn btn-outline-secondary btn-sm">⏮ Latest</a>
+        {% else %}<span></span>{% endif %}
+        {% if next_before %}
+        <a href="/history?before={{ next_before }}" id="history-more" data-before="{{ next_before }}" class="btn btn-outline-secondary btn-sm">Older ⏭</a>
+        {% endif %}
+    </div>
 </div>
+<script src="{{ asset_url('js/app.js') }}"></script>
+</body>
+</html>
+'''
 
-<!-- Filter Script -->
-<script>
-    const filterDropdown = document.getElementById('priorityFilter');
-    filterDropdown.addEventListener('change', function () {
-        const selected = this.value;
-        const items = document.querySelectorAll('.task-item');
-        items.forEach(item => {
-            const priority = item.getAttribute('data-priority');
-            if (selected === 'all' || priority === selected) {
-                item.style.display = '';
-            } else {
-                item.style.display = 'none';
-            }
-        });
-    });
-</script>
 
+RECURRING_HTML = '''
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Repeating tasks - AutoDeployX</title>
+    <link href="{{ asset_url('vendor/bootstrap-5.3.0.min.css') }}" rel="stylesheet">
+    <link href="{{ asset_url('css/app.css') }}" rel="stylesheet">
+</head>
+<body class="bg-light">
+<div class="container py-4" style="max-width: 800px;">
+    <a href="/" class="text-decoration-none">⬅️ Back to Home</a>
+    <h4 class="my-3">🔁 Repeating tasks</h4>
+    <p class="text-muted small">Add one from the dashboard by picking how often it repeats. Each occurrence shows up as a task once its date is on screen.</p>
+    <ul class="list-group">
+        {% for rule in rules %}
+        <li class="list-group-item d-flex justify-content-between align-items-center">
+            <div>
+                <span>{{ rule.text }}</span>
+                <small class="text-muted">[{{ rule.priority_name }} - {{ rule.label }} from {{ rule.start_date }}{% if rule.end_date %} until {{ rule.end_date }}{% endif %}]</small>
+            </div>
+            <form method="POST" action="/recurring/{{ rule.id }}/delete">
+                <button class="btn btn-sm btn-outline-danger">Stop</button>
+            </form>
+        </li>
+        {% else %}
+        <li class="list-group-item text-muted">No repeating tasks.</li>
+        {% endfor %}
+    </ul>
+</div>
 </body>
 </html>
 '''
 
 
+FORGOT_PASSWORD_HTML = '''
+    <!DOCTYPE html>
+    <html><head><title>Reset Password</title>
+    <link href="{{ asset_url('vendor/bootstrap-5.3.0.min.css') }}" rel="stylesheet">
+    <link href="{{ asset_url('css/app.css') }}" rel="stylesheet"></head>
+    <body class="d-flex align-items-center justify-content-center vh-100 bg-light">
+        <div class="card p-4" style="max-width: 400px;">
+            <h4 class="text-center mb-3">🔐 Reset Your Password</h4>
+            <form method="POST">
+                <input type="text" name="username" class="form-control mb-3" placeholder="Enter your username" required>
+                <div class="input-group mb-3">
+    <input type="password" name="password" class="form-control" placeholder="New password" id="newPassword" required>
+    <span class="input-group-text" onclick="togglePassword('newPassword', this)">👁️</span>
+</div>
+
+<div class="input-group mb-3">
+    <input type="password" name="confirm_password" class="form-control" placeholder="Confirm password" id="confirmPassword" required>
+    <span class="input-group-text" onclick="togglePassword('confirmPassword', this)">👁️</span>
+</div>
+
+                <button type="submit" class="btn btn-primary w-100">Reset Password</button>
+            </form>
+            <a href="/login" class="d-block mt-3 text-center">Back to login</a>
+        </div>
+    <script src="{{ asset_url('js/app.js') }}"></script>
+    </body></html>
+'''
+
+
+# Every page is registered once under a name so Flask's Jinja environment
+# compiles it a single time and serves later renders from its template cache.
+TEMPLATES = {
+    'index.html': HTML_TEMPLATE,
+    'login.html': LOGIN_HTML,
+    'signup.html': SIGNUP_HTML,
+    'profile.html': PROFILE_HTML,
+    'forgot_password.html': FORGOT_PASSWORD_HTML,
+    'search.html': SEARCH_HTML,
+    'calendar.html': CALENDAR_HTML,
+    'history.html': HISTORY_HTML,
+    'recurring.html': RECURRING_HTML,
+}
+app.jinja_loader = DictLoader(TEMPLATES)
+# Compiled by create_app(); the rest compile on their first render.
+HOT_TEMPLATES = ('index.html', 'login.html')
+
+
+def warm_templates(names=TEMPLATES):
+    for name in names:
+        app.jinja_env.get_template(name)
+
+
+def render_page(name, **context):
+    with metrics.timed(metrics.template_render, template=name):
+        return render_template(name, **context)
+
+
+def hash_password(password):
+    try:
+        with metrics.timed(metrics.password_hash, op='generate'):
+            return password_hasher.generate(password)
+    except passwords.HashingBusy:
+        raise TooManyRequests('Too many requests, please try again shortly.', retry_after=2)
+
+
+def verify_password(pwhash, password):
+    try:
+        with metrics.timed(metrics.password_hash, op='check'):
+            return password_hasher.check(pwhash, password)
+    except passwords.HashingBusy:
+        raise TooManyRequests('Too many requests, please try again shortly.', retry_after=2)
+
+
+def admit_attempt(username=None):
+    """Refuse with 429 once a client IP (or username) runs out of attempts."""
+    if not ip_login_limiter.allow(request.remote_addr):
+        raise TooManyRequests('Too many attempts, please wait a minute.', retry_after=60)
+    if username is not None and not user_login_limiter.allow(username):
+        raise TooManyRequests('Too many attempts for this account, please wait a minute.',
+                              retry_after=60)
+
+
+def _parse_date(value):
+    if value is not None and not isinstance(value, str):
+        raise ApiError('dates must be ISO date strings (YYYY-MM-DD)')
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+class DashboardFilters:
+    """Dashboard query-string filters, normalised so bad input means "no filter"."""
+
+    STATUSES = ('all', 'open', 'done')
+
+    def __init__(self, priority='all', status='all', start=None, end=None, after=None, before=None):
+        self.priority = priority if priority in PRIORITY_LEVELS else 'all'
+        self.status = status if status in self.STATUSES else 'all'
+        self.start = start
+        self.end = end
+        # Page cursors: dates after ``after``, or the dates just before ``before``.
+        self.after = after
+        self.before = None if after else before
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(
+            priority=args.get('priority', 'all'),
+            status=args.get('status', 'all'),
+            start=_parse_date(args.get('start')),
+            end=_parse_date(args.get('end')),
+            after=_parse_date(args.get('after')),
+            before=_parse_date(args.get('before')),
+        )
+
+    @property
+    def default_page(self):
+        """No cursor and no date range: the page the dashboard opens on."""
+        return not (self.after or self.before or self.start or self.end)
+
+    def query_args(self):
+        """Filter values to carry over into pagination links (without the cursor)."""
+        args = {'priority': self.priority, 'status': self.status,
+                'start': self.start and self.start.isoformat(),
+                'end': self.end and self.end.isoformat()}
+        return {k: v for k, v in args.items() if v and v != 'all'}
+
+    def apply(self, stmt):
+        tasks = Task.__table__
+        if self.priority != 'all':
+            stmt = stmt.where(tasks.c.priority == PRIORITY_LEVELS[self.priority])
+        if self.status != 'all':
+            stmt = stmt.where(tasks.c.completed.is_(self.status == 'done'))
+        if self.start:
+            stmt = stmt.where(tasks.c.due_date >= self.start)
+        if self.end:
+            stmt = stmt.where(tasks.c.due_date <= self.end)
+        return stmt
+
+
+def select_tasks(user_id, filters, *columns):
+    """A Core select of ``columns`` from the user's tasks that match ``filters``."""
+    tasks = Task.__table__
+    return filters.apply(db.select(*columns).where(tasks.c.user_id == user_id))
+
+
+def default_start(user_id, filters, today=None):
+    """Where the dashboard opens: today, or the due date of the earliest
+    open task if that is overdue.  Read from DailySummary, so it costs one
+    row per day used rather than a scan of the user's tasks."""
+    today = today or date.today()
+    if filters.status == 'done':
+        return today
+    summary = DailySummary.__table__
+    stmt = db.select(db.func.min(summary.c.day)).where(
+        summary.c.user_id == user_id, summary.c.day < today, summary.c.total > summary.c.completed)
+    if filters.priority != 'all':
+        stmt = stmt.where(summary.c.priority == PRIORITY_LEVELS[filters.priority])
+    return db.session.execute(stmt).scalar() or today
+
+
+def window_start(user_id, filters):
+    """The earliest due date a forward page may show, or None for no limit
+    beyond the filters'."""
+    if filters.after:
+        return filters.after + timedelta(days=1)
+    if filters.default_page:
+        return default_start(user_id, filters)
+    return None
+
+
+def window_dates(user_id, filters, days):
+    """The first ``days + 1`` distinct due dates of the page ``filters`` asks
+    for; with a ``before`` cursor, the last ones before it, latest first."""
+    due_date = Task.__table__.c.due_date
+    stmt = select_tasks(user_id, filters, due_date).distinct().where(due_date.isnot(None))
+    if filters.before:
+        stmt = stmt.where(due_date < filters.before).order_by(due_date.desc())
+    else:
+        start = window_start(user_id, filters)
+        if start:
+            stmt = stmt.where(due_date >= start)
+        stmt = stmt.order_by(due_date)
+    return db.session.execute(stmt.limit(days + 1)).scalars().all()
+
+
+def has_dates_before(user_id, filters, day):
+    due_date = Task.__table__.c.due_date
+    stmt = select_tasks(user_id, filters, due_date).where(due_date < day).limit(1)
+    return db.session.execute(stmt).first() is not None
+
+
+def expand_window(user_id, filters, days=None):
+    """Write the recurring tasks the dashboard_window page for ``filters``
+    will show: ``days`` days on from where it starts, and further if the
+    page's own dates run past that.  Call before reading the data version."""
+    days = days or app.config['DASHBOARD_DAYS_PER_PAGE']
+    if filters.before:
+        # An earlier page only shows dates before ones already on screen.
+        expand_recurring(user_id, filters.before)
+        return
+    until = (filters.after or date.today()) + timedelta(days=days)
+    if filters.end:
+        until = min(until, filters.end)
+    expand_recurring(user_id, until)
+    dates = window_dates(user_id, filters, days)[:days]
+    if dates and dates[-1] > until:
+        expand_recurring(user_id, dates[-1])
+
+
+def dashboard_window(user_id, filters, days=None):
+    """Return the tasks for a page of due dates and the cursors after and
+    before it.
+
+    Pages are keyed on due date rather than offsets: first pick ``days``
+    distinct dates after ``filters.after`` (before ``filters.before``; from
+    default_start on the opening page), then load only the tasks on those
+    dates.  Both queries run off ``ix_task_user_due_completed``, so a page
+    costs the same no matter how much history the user has.  Legacy tasks
+    without a due date come last on the opening page.
+
+    The tasks come back as an iterator of :class:`TaskRow`, ordered by due
+    date, completion and time.  It reads the cursor a batch at a time, so
+    iterate it once, within the request; nothing builds ORM objects or a
+    list of the whole page on the way.
+    """
+    days = days or app.config['DASHBOARD_DAYS_PER_PAGE']
+    dates = window_dates(user_id, filters, days)
+    next_after = next_before = None
+    if filters.before:
+        if len(dates) > days:
+            dates = dates[:days]
+            next_before = dates[-1].isoformat()
+        dates.reverse()
+        # The dates from the cursor on are what the page came from.
+        next_after = (dates[-1] if dates else filters.before - timedelta(days=1)).isoformat()
+    else:
+        if len(dates) > days:
+            dates = dates[:days]
+            next_after = dates[-1].isoformat()
+        elif filters.status != 'done':
+            # Recurring tasks past the last date aren't written yet; offer the
+            # next page anyway and expand_window fills it in.
+            last = dates[-1] if dates else filters.after or date.today()
+            if recurring_after(user_id, last):
+                next_after = last.isoformat()
+        first = dates[0] if dates else window_start(user_id, filters)
+        if first and has_dates_before(user_id, filters, first):
+            next_before = first.isoformat()
+    tasks = Task.__table__
+    in_window = [tasks.c.due_date.in_(dates)] if dates else []
+    if filters.default_page:
+        in_window.append(tasks.c.due_date.is_(None))
+    if not in_window:
+        return iter(()), next_after, next_before
+    stmt = (select_tasks(user_id, filters, *(tasks.c[name] for name in TaskRow._fields))
+            .where(db.or_(*in_window))
+            .order_by(tasks.c.due_date.is_(None), tasks.c.due_date, tasks.c.completed, tasks.c.time)
+            .execution_options(stream_results=True))
+    result = db.session.execute(stmt).yield_per(app.config['DASHBOARD_BATCH_SIZE'])
+    return (TaskRow._make(row) for row in result), next_after, next_before
+
+
+def bump_data_version(user_id, conn=None):
+    """Mark a user's cached dashboard as stale; call before committing a write.
+
+    Returns the new version, which live-update events are stamped with.
+    """
+    users = User.__table__
+    stmt = users.update().where(users.c.id == user_id).values(data_version=users.c.data_version + 1)
+    conn = conn or router.connection(router.current())
+    conn.execute(stmt)
+    return data_version_of(conn, user_id)
+
+
+def dialect_insert(conn):
+    """The INSERT construct with ON CONFLICT support for this connection's database."""
+    return {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}[conn.dialect.name]
+
+
+def insert_returning_ids(conn, table, rows):
+    """Insert ``rows`` (mappings with the same keys) and return their new ids
+    in order.  PostgreSQL takes them in pages of PG_BATCH_PAGE_SIZE through
+    execute_values; SQLite, without RETURNING here, one at a time."""
+    if not rows:
+        return []
+    if conn.dialect.name == 'postgresql':
+        return conn.execute(table.insert().returning(table.c.id), rows).scalars().all()
+    return [conn.execute(table.insert().values(**values)).inserted_primary_key[0] for values in rows]
+
+
+def update_daily_summary(conn, user_id, added=(), removed=(), toggled=()):
+    """Apply a write's effect on the user's DailySummary rows.
+
+    Each argument is a list of task mappings (``due_date``, ``priority``,
+    ``completed``); for ``toggled`` tasks ``completed`` is the new state.
+    Call inside the same transaction as the task write.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for rows, total, sign in ((added, 1, 1), (removed, -1, -1), (toggled, 0, None)):
+        for row in rows:
+            if row['due_date'] is None:
+                continue
+            delta = deltas[(row['due_date'], row['priority'] or 0)]
+            delta[0] += total
+            if sign is None:
+                delta[1] += 1 if row['completed'] else -1
+            elif row['completed']:
+                delta[1] += sign
+    params = [dict(user_id=user_id, day=day, priority=priority, total=t, completed=c)
+              for (day, priority), (t, c) in deltas.items() if t or c]
+    if not params:
+        return
+    summary = DailySummary.__table__
+    stmt = dialect_insert(conn)(summary)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=[summary.c.user_id, summary.c.day, summary.c.priority],
+        set_={'total': summary.c.total + stmt.excluded.total,
+              'completed': summary.c.completed + stmt.excluded.completed},
+    ), params)
+    if removed:
+        conn.execute(summary.delete().where(summary.c.user_id == user_id, summary.c.total <= 0))
+
+
+def rebuild_daily_summary(conn, user_id=None):
+    """Recompute DailySummary from the task table, for one user or everyone."""
+    summary, tasks = DailySummary.__table__, Task.__table__
+    delete = summary.delete()
+    counts = db.select(
+        tasks.c.user_id, tasks.c.due_date, db.func.coalesce(tasks.c.priority, 0),
+        db.func.count(), db.func.sum(db.case((tasks.c.completed, 1), else_=0)),
+    ).where(tasks.c.due_date.isnot(None), tasks.c.user_id.isnot(None))
+    if user_id is not None:
+        delete = delete.where(summary.c.user_id == user_id)
+        counts = counts.where(tasks.c.user_id == user_id)
+    counts = counts.group_by(tasks.c.user_id, tasks.c.due_date, db.func.coalesce(tasks.c.priority, 0))
+    conn.execute(delete)
+    conn.execute(summary.insert().from_select(
+        ['user_id', 'day', 'priority', 'total', 'completed'], counts))
+
+
+@app.cli.command('rebuild-summaries')
+@click.option('--user', 'user_id', type=int, help='Only rebuild this user id.')
+def rebuild_summaries_command(user_id):
+    """Recompute the per-day task counts from the task table."""
+    for shard in router.shards():
+        with router.engine(shard).begin() as conn:
+            rebuild_daily_summary(conn, user_id)
+    click.echo('daily summaries rebuilt')
+
+
+def archivable(tasks, today):
+    """Condition on the task table for rows old enough to archive."""
+    completed_before = today - timedelta(days=app.config['ARCHIVE_COMPLETED_DAYS'])
+    condition = db.and_(tasks.c.completed.is_(True), tasks.c.due_date < completed_before)
+    if app.config['ARCHIVE_OVERDUE_DAYS']:
+        overdue_before = today - timedelta(days=app.config['ARCHIVE_OVERDUE_DAYS'])
+        condition = db.or_(condition, db.and_(db.not_(tasks.c.completed.is_(True)),
+                                              tasks.c.due_date < overdue_before))
+    return condition
+
+
+def archive_batch(conn, after_id, today, limit):
+    """Move up to ``limit`` archivable tasks with ids above ``after_id``.
+
+    Returns how many moved, the last id moved (None once nothing is left)
+    and the ids of the users whose tasks moved.  Walking the primary key
+    means a whole run reads the task table once, however many batches it
+    takes.
+    """
+    tasks, archived = Task.__table__, ArchivedTask.__table__
+    columns = [tasks.c[column.name] for column in archived.c if column.name in tasks.c]
+    rows = conn.execute(
+        db.select(*columns).where(tasks.c.id > after_id, archivable(tasks, today))
+        .order_by(tasks.c.id).limit(limit)).mappings().all()
+    if not rows:
+        return 0, None, set()
+    # Delete first: if another run (say `flask archive-tasks` next to the
+    # scheduler) already moved some of these, give up this batch rather
+    # than archive them twice.
+    deleted = conn.execute(tasks.delete().where(tasks.c.id.in_([row['id'] for row in rows])))
+    if deleted.rowcount != len(rows):
+        raise RuntimeError('tasks were archived concurrently; try again')
+    now = datetime.now()
+    conn.execute(archived.insert(), [
+        {**{key: value for key, value in row.items() if key != 'id'}, 'task_id': row['id'], 'archived_at': now}
+        for row in rows])
+    by_user = defaultdict(list)
+    for row in rows:
+        by_user[row['user_id']].append(row)
+    by_user.pop(None, None)
+    for user_id, user_rows in by_user.items():
+        update_daily_summary(conn, user_id, removed=user_rows)
+        bump_data_version(user_id, conn)
+    return len(rows), rows[-1]['id'], set(by_user)
+
+
+def archive_tasks(today=None):
+    """Archive every task that qualifies, shard by shard and one committed
+    batch at a time so other writes get in between.  Returns the number of
+    tasks moved."""
+    today = today or date.today()
+    limit = app.config['ARCHIVE_BATCH_SIZE']
+    moved = 0
+    for shard in router.shards():
+        after_id = 0
+        with router.using(shard):
+            while True:
+                count, after_id, user_ids = run_write(lambda conn: archive_batch(conn, after_id, today, limit))
+                if after_id is None:
+                    break
+                moved += count
+                for user_id in user_ids:
+                    user_cache.pop(user_id)
+    return moved
+
+
+@app.cli.command('archive-tasks')
+def archive_tasks_command():
+    """Move long-completed and long-overdue tasks into the archive."""
+    click.echo(f'{archive_tasks()} tasks archived')
+
+
+def expand_recurring(user_id, until):
+    """Write the user's recurring occurrences up to ``until`` as tasks.
+
+    Each rule remembers the last day it was expanded to, so every day is
+    written once, and only when a page or API call reaches it.  Returns
+    the number of tasks added.
+    """
+    until = min(until, date.today() + timedelta(days=app.config['RECURRING_MAX_DAYS']))
+    rules, tasks = RecurringRule.__table__, Task.__table__
+    pending = db.session.execute(db.select(rules).where(
+        rules.c.user_id == user_id,
+        rules.c.start_date <= until,
+        db.or_(rules.c.materialized_until.is_(None), rules.c.materialized_until < until),
+        db.or_(rules.c.end_date.is_(None), rules.c.materialized_until.is_(None),
+               rules.c.materialized_until < rules.c.end_date),
+    )).mappings().all()
+    if not pending:
+        return 0
+
+    def materialize(conn):
+        added = []
+        for rule in pending:
+            done = rule['materialized_until']
+            # Claim the days first; if another request already moved the
+            # marker, it is writing them and this one skips the rule.
+            claimed = conn.execute(rules.update().where(
+                rules.c.id == rule['id'],
+                rules.c.materialized_until.is_(None) if done is None else rules.c.materialized_until == done,
+            ).values(materialized_until=until))
+            if claimed.rowcount != 1:
+                continue
+            after = done or rule['start_date'] - timedelta(days=1)
+            for day in recurrence.dates(rule['pattern'], rule['start_date'], after, until, rule['end_date']):
+                added.append(dict(text=rule['text'], priority=rule['priority'], due_date=day, completed=False,
+                                  time=rule['time'], user_id=user_id, rule_id=rule['id']))
+        if not added:
+            return None, []
+        ids = insert_returning_ids(conn, tasks, added)
+        created = [Task(id=id, **values).to_dict() for id, values in zip(ids, added)]
+        update_daily_summary(conn, user_id, added=added)
+        return bump_data_version(user_id, conn), created
+
+    version, created = run_write(materialize)
+    # The write may have gone through the write queue's own connection; end
+    # this session's read transaction so the rest of the request sees it.
+    db.session.commit()
+    if created:
+        user_changed(user_id, version)
+        publish_tasks(user_id, version, 'created', created)
+    return len(created)
+
+
+def recurring_after(user_id, day):
+    """True if one of the user's rules still falls due after ``day``."""
+    rules = RecurringRule.__table__
+    if day >= date.today() + timedelta(days=app.config['RECURRING_MAX_DAYS']):
+        return False
+    return db.session.execute(db.select(rules.c.id).where(
+        rules.c.user_id == user_id,
+        db.or_(rules.c.end_date.is_(None), rules.c.end_date > day),
+    ).limit(1)).first() is not None
+
+
+def hold_lease(name, ttl):
+    """Take or renew the named lease for this process; True while it holds it."""
+    holder = f'{socket.gethostname()}:{os.getpid()}'
+    leases = Lease.__table__
+
+    def claim(conn):
+        now = datetime.now()
+        values = dict(name=name, holder=holder, expires_at=now + timedelta(seconds=ttl))
+        conn.execute(dialect_insert(conn)(leases).on_conflict_do_nothing(index_elements=[leases.c.name]), values)
+        taken = conn.execute(leases.update().where(
+            leases.c.name == name, db.or_(leases.c.holder == holder, leases.c.expires_at < now),
+        ).values(values))
+        return taken.rowcount == 1
+
+    return run_write(claim, directory=True)
+
+
+def reminder_time(due_date, due_time):
+    due = datetime.combine(due_date, due_time or app.config['REMINDER_DEFAULT_TIME'])
+    return due - timedelta(minutes=app.config['REMINDER_LEAD_MINUTES'])
+
+
+def fire_reminder(shard, task_id, remind_at):
+    """Put a reminder in the outbox, unless the task was done, deleted or
+    moved since it was planned."""
+    tasks, reminders = Task.__table__, Reminder.__table__
+
+    def write(conn):
+        task = conn.execute(db.select(tasks.c.user_id, tasks.c.text, tasks.c.due_date, tasks.c.time).where(
+            tasks.c.id == task_id, tasks.c.completed == db.false())).first()
+        if task is None or task.user_id is None or reminder_time(task.due_date, task.time) != remind_at:
+            return
+        conn.execute(dialect_insert(conn)(reminders).on_conflict_do_nothing(
+            index_elements=[reminders.c.task_id, reminders.c.remind_at],
+        ), dict(user_id=task.user_id, task_id=task_id, text=task.text,
+                remind_at=remind_at, created_at=datetime.now()))
+
+    with router.using(shard):
+        run_write(write)
+
+
+# (shard, task id, remind_at) already on this process's heap
+planned_reminders = set()
+
+
+def plan_reminders(now=None):
+    """Put the reminders due before the next planning run on the scheduler's
+    heap, and any missed in the last REMINDER_GRACE_MINUTES (say, while no
+    worker held the lease) straight after.  Firing is idempotent, so a new
+    leader planning the same reminders again is harmless."""
+    now = now or datetime.now()
+    start = now - timedelta(minutes=app.config['REMINDER_GRACE_MINUTES'])
+    end = now + timedelta(seconds=app.config['REMINDER_INTERVAL'])
+    lead = timedelta(minutes=app.config['REMINDER_LEAD_MINUTES'])
+    tasks = Task.__table__
+    planned_reminders.difference_update([key for key in planned_reminders if key[2] < start])
+    for shard in router.shards():
+        with router.using(shard):
+            rows = db.session.execute(db.select(tasks.c.id, tasks.c.due_date, tasks.c.time).where(
+                tasks.c.completed == db.false(),  # matches ix_task_open_due
+                tasks.c.due_date.between((start + lead).date(), (end + lead).date()),
+            )).all()
+        for task_id, due_date, due_time in rows:
+            remind_at = reminder_time(due_date, due_time)
+            if not start <= remind_at < end or (shard, task_id, remind_at) in planned_reminders:
+                continue
+            planned_reminders.add((shard, task_id, remind_at))
+            scheduler.at(remind_at.timestamp(), in_app_context(fire_reminder, shard, task_id, remind_at))
+
+
+def in_app_context(fn, *args):
+    """Wrap ``fn(*args)`` to run in an app context, as scheduled jobs need."""
+    @wraps(fn)
+    def run():
+        with app.app_context():
+            return fn(*args)
+    return run
+
+
+def renew_scheduler_lease():
+    return hold_lease('scheduler', app.config['LEASE_TTL'])
+
+
+scheduler = background.Scheduler(app.logger, leader=in_app_context(renew_scheduler_lease),
+                                 lease_interval=app.config['LEASE_RENEW'])
+scheduler.every(app.config['ARCHIVE_INTERVAL'], in_app_context(archive_tasks))
+scheduler.every(app.config['REMINDER_INTERVAL'], in_app_context(plan_reminders))
+
+
+@app.before_request
+def start_scheduler():
+    scheduler.ensure_started()
+
+
+def data_version_of(conn, user_id):
+    """The user's data_version on the shard ``conn`` belongs to.
+
+    Raises shards.UserMoved if the user's tasks don't live there (any more),
+    which fences off writes from workers still caching the old shard.
+    """
+    shard = router.shard_of(conn)
+    if shard is shards.MAIN:
+        version = prepared.execute(conn, 'data_version', {'user_id': user_id}).scalar()
+    else:
+        version = prepared.execute(conn, 'data_version_on_shard', {'user_id': user_id, 'shard': shard}).scalar()
+    if version is None:
+        raise shards.UserMoved(user_id)
+    return version
+
+
+def current_data_version():
+    """The logged-in user's data_version, read now rather than from the
+    per-worker cached user, whose copy can lag behind other workers' writes
+    and whose shard can be stale (see data_version_of)."""
+    return data_version_of(router.connection(current_user.shard), current_user.id)
+
+
+def shard_stub(conn, user_id, shard, data_version=0):
+    """Insert or claim the stub ``user`` row a user needs on ``shard``.
+
+    Only id, shard and data_version matter there; the directory in the main
+    database has the real username and password.  A user who moved away
+    leaves their stub behind pointing at the new shard, so foreign keys
+    still hold for writes in flight and data_version_of turns them away.
+    """
+    users = User.__table__
+    conn.execute(dialect_insert(conn)(users).on_conflict_do_update(
+        index_elements=[users.c.id], set_=dict(shard=shard, data_version=data_version),
+    ), dict(id=user_id, username=str(user_id), password='', description='',
+            data_version=data_version, shard=shard))
+
+
+def ensure_shard_user(user_id, shard):
+    """Give a user the stub row their shard needs, say after a signup that
+    failed between the directory and the shard."""
+    with router.using(shard):
+        run_write(lambda conn: shard_stub(conn, user_id, shard))
+
+
+write_queues = None
+if SQLITE_PRODUCTION and app.config['SQLITE_WRITE_QUEUE']:
+    # One writer per database: each file has its own lock, so the queues
+    # commit in parallel.
+    write_queues = {shard: sqlite_mode.WriteQueue(
+        functools.partial(router.engine, shard),
+        max_batch=app.config['SQLITE_WRITE_BATCH'],
+        max_delay=app.config['SQLITE_WRITE_DELAY_MS'] / 1000,
+    ) for shard in router.shards()}
+
+
+def run_write(fn, directory=False):
+    """Run ``fn(connection)`` in a committed transaction and return its result.
+
+    The connection is to the current user's shard (see shards.py), or with
+    ``directory`` to the main database, which holds logins and leases.
+    In SQLite production mode this goes through that database's
+    group-committing write queue; otherwise it uses the request's session.
+    """
+    shard = shards.MAIN if directory else router.current()
+    if write_queues is not None:
+        return write_queues[shard].submit(fn)
+    result = fn(router.connection(shard))
+    db.session.commit()
+    return result
+
+
+@app.errorhandler(shards.UserMoved)
+def retry_moved_user(error):
+    # This worker had the user cached on their old shard.  Drop the cache
+    # and replay the request (307 keeps the method and body), which looks
+    # the user up afresh in the directory.
+    user_cache.pop(error.user_id)
+    db.session.rollback()
+    return redirect(request.full_path, 307)
+
+
+def move_user(user_id, target):
+    """Move a user's tasks and everything hanging off them to ``target``.
+
+    Rows get new ids there, since each shard numbers its own.  The source
+    stays write-locked from the first statement to the last, so writes for
+    the user wait for the move and are then turned away by the fence (see
+    data_version_of) and replayed on the new shard.  Other users on the
+    source shard wait too, so moves are run one user at a time.  Returns
+    the number of rows copied.
+    """
+    users = User.__table__
+    source = db.session.execute(db.select(users.c.shard).where(users.c.id == user_id)).first()
+    db.session.commit()
+    if source is None:
+        raise LookupError(f'no user {user_id}')
+    source = source.shard
+    if source == target:
+        return 0
+    with ExitStack() as stack:
+        src = stack.enter_context(router.engine(source).connect())
+        dst = stack.enter_context(router.engine(target).connect())
+        directory_tx = None
+        if shards.MAIN in (source, target):
+            directory = src if source is shards.MAIN else dst
+        else:
+            directory = stack.enter_context(db.engine.connect())
+            directory_tx = directory.begin()
+        # Connections roll back whatever is left uncommitted when closed.
+        src_tx = src.begin()
+        version = bump_data_version(user_id, src)
+        rows = {model: src.execute(db.select(model.__table__).where(
+            model.__table__.c.user_id == user_id)).mappings().all() for model in SHARDED_MODELS}
+
+        dst_tx = dst.begin()
+        if target is not shards.MAIN:
+            shard_stub(dst, user_id, target, version)
+        # Leftovers of an interrupted move would otherwise be copied twice.
+        for model in reversed(SHARDED_MODELS):
+            dst.execute(model.__table__.delete().where(model.__table__.c.user_id == user_id))
+        new_ids = {RecurringRule: {}, Task: {}}
+        for model in SHARDED_MODELS:
+            table = model.__table__
+            for row in rows[model]:
+                values = dict(row)
+                old_id = values.pop('id', None)
+                if 'rule_id' in values:
+                    values['rule_id'] = new_ids[RecurringRule].get(values['rule_id'])
+                if model is Reminder:
+                    values['task_id'] = new_ids[Task].get(values['task_id'], values['task_id'])
+                result = dst.execute(table.insert().values(**values))
+                if model in new_ids:
+                    new_ids[model][old_id] = result.inserted_primary_key[0]
+
+        moved = dict(shard=target)
+        if target is shards.MAIN:
+            moved['data_version'] = version
+        directory.execute(users.update().where(users.c.id == user_id).values(**moved))
+        dst_tx.commit()
+        if directory_tx is not None:
+            directory_tx.commit()
+
+        if source is not shards.MAIN:
+            shard_stub(src, user_id, target, version)
+        for model in reversed(SHARDED_MODELS):
+            src.execute(model.__table__.delete().where(model.__table__.c.user_id == user_id))
+        src_tx.commit()
+    user_cache.pop(user_id)
+    return sum(len(model_rows) for model_rows in rows.values())
+
+
+def shard_name(shard):
+    return 'main' if shard is shards.MAIN else str(shard)
+
+
+@app.cli.command('move-user')
+@click.argument('user_id', type=int)
+@click.argument('shard')
+def move_user_command(user_id, shard):
+    """Move a user's tasks to SHARD, a shard number or "main"."""
+    if shard == 'main':
+        target = shards.MAIN
+    elif shard.isdigit() and int(shard) < router.count:
+        target = int(shard)
+    else:
+        raise click.BadParameter(f'expected "main" or 0-{router.count - 1}', param_hint='SHARD')
+    try:
+        copied = move_user(user_id, target)
+    except LookupError as error:
+        raise click.ClickException(str(error))
+    click.echo(f'user {user_id}: {copied} rows moved to {shard_name(target)}')
+
+
+@app.cli.command('rebalance')
+def rebalance_command():
+    """Move every user who is not on their home shard there, one at a time."""
+    users = User.__table__
+    rows = db.session.execute(db.select(users.c.id, users.c.shard).order_by(users.c.id)).all()
+    db.session.commit()
+    moved = 0
+    for user_id, shard in rows:
+        home = router.home(user_id)
+        if shard == home:
+            continue
+        copied = move_user(user_id, home)
+        click.echo(f'user {user_id}: {copied} rows moved to {shard_name(home)}')
+        moved += 1
+        time.sleep(app.config['REBALANCE_PAUSE'])
+    click.echo(f'{moved} users moved')
+
+
+task_events = events.Broker(app.config['EVENTS_MAX_PENDING'])
+
+
+def publish_tasks(user_id, version, kind, tasks):
+    """Tell the user's open dashboards about a committed change to ``tasks``."""
+    task_events.publish(user_id, {'type': kind, 'version': version, 'tasks': tasks})
+
+
+dashboard_cache = LRUCache(app.config['DASHBOARD_CACHE_SIZE'])
+
+
+def dashboard_etag(user_id, version):
+    # The page also depends on the hour (suggestions) and the query string
+    # (filters and page), so both are part of the key.
+    return f"{user_id}-{version}-{datetime.now():%Y%m%d%H}-{request.query_string.decode()}"
+
 
 @app.route("/", methods=["GET", "POST"])
 @login_required
 def index():
     if request.method == "POST":
-        new_task = Task(
+        try:
+            due_date = date.fromisoformat(request.form.get("due_date", ""))
+        except ValueError:
+            return redirect("/")
+        values = dict(
             text=request.form.get("task"),
-            priority=request.form.get("priority"),
-            due_date=request.form.get("due_date"),
+            priority=PRIORITY_LEVELS.get(request.form.get("priority")),
+            due_date=due_date,
             completed=False,
-            time=datetime.now().strftime("%H:%M:%S"),
+            time=datetime.now().time().replace(microsecond=0),
             user_id=current_user.id
         )
-        db.session.add(new_task)
-        db.session.commit()
+        user_id = current_user.id
+        repeat = request.form.get("repeat")
+        if repeat in recurrence.PATTERNS:
+            return add_recurring_rule(values, repeat)
+
+        def add_task(conn):
+            result = conn.execute(Task.__table__.insert().values(**values))
+            task = Task(id=result.inserted_primary_key[0], **values).to_dict()
+            update_daily_summary(conn, user_id, added=[values])
+            return bump_data_version(user_id, conn), task
+
+        version, task = run_write(add_task)
+        user_changed(user_id, version)
+        publish_tasks(user_id, version, 'created', [task])
         return redirect("/")
 
-    tasks = Task.query.filter_by(user_id=current_user.id).order_by(Task.completed, Task.time).all()
+    etag = dashboard_etag(current_user.id, current_data_version())
+    if request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+    else:
+        html = dashboard_cache.get(etag)
+        if html is None:
+            html = render_dashboard()
+            dashboard_cache.set(etag, html)
+        response = make_response(html)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def add_recurring_rule(values, pattern):
+    user_id = values['user_id']
+
+    def add_rule(conn):
+        conn.execute(RecurringRule.__table__.insert().values(
+            user_id=user_id, text=values['text'], priority=values['priority'], time=values['time'],
+            pattern=pattern, start_date=values['due_date']))
+        # The cached dashboard must be rebuilt to show the first occurrences.
+        return bump_data_version(user_id, conn)
+
+    user_changed(user_id, run_write(add_rule))
+    return redirect("/")
+
+
+@app.route("/recurring")
+@login_required
+def recurring_page():
+    rules = RecurringRule.query.filter_by(user_id=current_user.id).order_by(RecurringRule.start_date).all()
+    return render_page('recurring.html', rules=rules)
+
+
+@app.route("/recurring/<int:id>/delete", methods=["POST"])
+@login_required
+def delete_recurring_rule(id):
+    user_id = current_user.id
+    rules, tasks = RecurringRule.__table__, Task.__table__
+
+    def stop_rule(conn):
+        if conn.execute(db.select(rules.c.id).where(rules.c.id == id, rules.c.user_id == user_id)).first() is None:
+            return None, []
+        # Occurrences still to come go with the rule; past ones stay as plain tasks.
+        upcoming = db.and_(tasks.c.rule_id == id, tasks.c.user_id == user_id,
+                           tasks.c.due_date >= date.today(), tasks.c.completed == db.false())
+        removed = [dict(row) for row in conn.execute(db.select(tasks).where(upcoming)).mappings()]
+        conn.execute(tasks.delete().where(upcoming))
+        conn.execute(tasks.update().where(tasks.c.rule_id == id).values(rule_id=None))
+        conn.execute(rules.delete().where(rules.c.id == id))
+        update_daily_summary(conn, user_id, removed=removed)
+        return bump_data_version(user_id, conn), removed
+
+    version, removed = run_write(stop_rule)
+    if version is not None:
+        user_changed(user_id, version)
+        publish_tasks(user_id, version, 'deleted', [Task(**row).to_dict() for row in removed])
+    return redirect("/recurring")
+
+
+def render_dashboard():
+    filters = DashboardFilters.from_args(request.args)
+    expand_window(current_user.id, filters)
+    # Read before the tasks, so the event stream replays anything newer.
+    version = current_data_version()
+    tasks, next_after, next_before = dashboard_window(current_user.id, filters)
     calendar = defaultdict(list)
-    for t in tasks:
-        calendar[t.due_date].append(t)
-    today_str = datetime.now().strftime('%Y-%m-%d')
-    today_tasks = [t for t in tasks if t.due_date == today_str]
-    all_done = all(t.completed for t in today_tasks) if today_tasks else False
-    suggestions = suggest_tasks()
-    return render_template_string(HTML_TEMPLATE, calendar=calendar, today=today_str, all_done=all_done, suggestions=suggestions)
+    for task in tasks:
+        calendar[task.due_date].append(task)
+    today = date.today()
+    today_str = today.isoformat()
+    summary = task_summary(current_user.id, today)
+    all_done = summary.today_total > 0 and summary.today_open == 0
+    suggestions = suggestion_engine.suggest(current_user.id, summary)
+    dates = [d for d in calendar if d is not None]
+    counts = day_counts(current_user.id, min(dates), max(dates)) if dates else {}
+    return render_page('index.html', calendar=calendar, today=today_str, all_done=all_done,
+                           suggestions=suggestions, filters=filters, next_after=next_after, next_before=next_before,
+                           version=version, day_counts=counts, repeat_labels=recurrence.LABELS)
+
+
+def heat_level(total, busiest):
+    """0 for an empty day, else 1-4 by how busy it is next to the month's busiest day."""
+    if not total:
+        return 0
+    return 1 + 3 * (total - 1) // max(busiest - 1, 1)
+
+
+@app.route("/calendar")
+@login_required
+def month_calendar():
+    try:
+        first = datetime.strptime(request.args.get('month', ''), '%Y-%m').date()
+    except ValueError:
+        first = date.today().replace(day=1)
+    weeks = Calendar().monthdatescalendar(first.year, first.month)
+    counts = day_counts(current_user.id, weeks[0][0], weeks[-1][-1], archived=True)
+    busiest = max((total for total, _ in counts.values()), default=0)
+    cells = [[(day, *counts.get(day, (0, 0)), heat_level(counts.get(day, (0, 0))[0], busiest))
+              for day in week] for week in weeks]
+    previous = (first - timedelta(days=1)).replace(day=1)
+    following = (first + timedelta(days=31)).replace(day=1)
+    return render_page('calendar.html', month=first, weeks=cells, today=date.today(),
+                       previous=previous, following=following)
+
+
+@functools.lru_cache(maxsize=None)
+def search_enabled():
+    """Whether init_db() could install the FTS5 index; asked once per process."""
+    with db.engine.connect() as conn:
+        return search.available(conn) and search.installed(conn)
+
+
+def search_tasks(user_id, q, limit):
+    match = search.match_expression(user_id, q)
+    if not search_enabled() or match is None:
+        return []
+    return (db.session.query(Task).from_statement(search.SEARCH_SQL)
+            .params(match=match, user_id=user_id, limit=limit).all())
+
+
+@app.route("/search")
+@login_required
+def search_page():
+    q = request.args.get('q', '').strip()
+    limit = app.config['SEARCH_LIMIT']
+    return render_page('search.html', q=q, results=search_tasks(current_user.id, q, limit),
+                       limit=limit, enabled=search_enabled())
+
+
+def history_window(user_id, before=None, limit=None):
+    """One page of archived tasks, latest due date first, and the cursor
+    for the next page.  ``before`` is a (due_date, id) pair; seeking past it
+    on ix_archived_task_user_due costs the same on every page."""
+    limit = limit or app.config['HISTORY_PAGE_SIZE']
+    query = ArchivedTask.query.filter(ArchivedTask.user_id == user_id)
+    if before:
+        query = query.filter(db.tuple_(ArchivedTask.due_date, ArchivedTask.id) < db.tuple_(*before))
+    tasks = query.order_by(ArchivedTask.due_date.desc(), ArchivedTask.id.desc()).limit(limit + 1).all()
+    next_before = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_before = f'{tasks[-1].due_date.isoformat()}_{tasks[-1].id}'
+    return tasks, next_before
+
+
+def _parse_history_cursor(value):
+    day, _, task_id = (value or '').partition('_')
+    day = _parse_date(day)
+    return (day, int(task_id)) if day and task_id.isdigit() else None
+
+
+@app.route("/history")
+@login_required
+def history_page():
+    before = _parse_history_cursor(request.args.get('before'))
+    tasks, next_before = history_window(current_user.id, before)
+    return render_page('history.html', tasks=tasks, next_before=next_before, before=before,
+                       completed_days=app.config['ARCHIVE_COMPLETED_DAYS'],
+                       overdue_days=app.config['ARCHIVE_OVERDUE_DAYS'])
+
+
+def sse(kind, data, version):
+    # The id comes back as Last-Event-ID when the browser reconnects.
+    return f"id: {version}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/events")
+@login_required
+def task_event_stream():
+    """Server-Sent Events feeding the open dashboard its task changes.
+
+    Events published in this worker arrive straight away.  Changes made by
+    other workers (or missed because the client fell behind) show up as a
+    gap in ``version`` or at the next heartbeat's data_version check, and
+    are sent as a single ``stale`` event so the page offers a reload.
+    """
+    user_id = current_user.id
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', 0, type=int)
+    heartbeat = app.config['EVENTS_HEARTBEAT']
+    engine = router.engine(current_user.shard)
+    # The stream holds no request context and no database connection while
+    # it waits, only this worker's subscription.
+    subscription = task_events.subscribe(user_id)
+
+    def stream():
+        last = since
+        deadline = time.monotonic() + app.config['EVENTS_MAX_AGE']
+        event = events.STALE
+        try:
+            yield f"retry: {int(heartbeat * 1000)}\n\n"
+            while True:
+                if event is None or event is events.STALE:
+                    try:
+                        with engine.connect() as conn:
+                            current = data_version_of(conn, user_id)
+                    except shards.UserMoved:
+                        # Moved to another shard: end the stream, and the
+                        # browser reconnects to a worker that knows.
+                        user_cache.pop(user_id)
+                        return
+                    if current > last:
+                        last = current
+                        yield sse('stale', {'version': current}, current)
+                    elif event is None:
+                        yield ": keepalive\n\n"
+                elif event['version'] > last:
+                    gap = event['version'] > last + 1
+                    last = event['version']
+                    yield sse('stale' if gap else event['type'], event, last)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # The browser reconnects after `retry`, sending Last-Event-ID.
+                    return
+                event = subscription.get(min(heartbeat, remaining))
+        finally:
+            task_events.unsubscribe(subscription)
+
+    response = app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 
 @app.route("/toggle/<int:id>", methods=["POST"])
 @login_required
 def toggle_complete(id):
-    task = Task.query.filter_by(id=id, user_id=current_user.id).first()
-    if task:
-        task.completed = not task.completed
-        db.session.commit()
+    user_id = current_user.id
+    owned = {'b_task_id': id, 'b_user_id': user_id}
+
+    def toggle(conn):
+        # One UPDATE instead of load-modify-flush.
+        result = prepared.execute(conn, 'toggle_task', owned)
+        if not result.rowcount:
+            return None, []
+        row = prepared.execute(conn, 'owned_task', owned).first()
+        update_daily_summary(conn, user_id, toggled=[row._mapping])
+        return bump_data_version(user_id, conn), [Task(**row._mapping).to_dict()]
+
+    version, changed = run_write(toggle)
+    user_changed(user_id, version)
+    if changed:
+        publish_tasks(user_id, version, 'updated', changed)
     return redirect("/")
 
 @app.route("/delete/<int:id>")
 @login_required
 def delete(id):
-    task = Task.query.filter_by(id=id, user_id=current_user.id).first()
-    if task:
-        db.session.delete(task)
-        db.session.commit()
+    user_id = current_user.id
+    tasks = Task.__table__
+
+    owned = db.and_(tasks.c.id == id, tasks.c.user_id == user_id)
+
+    def delete_task(conn):
+        row = conn.execute(tasks.select().where(owned)).first()
+        if row is None:
+            return None, []
+        conn.execute(tasks.delete().where(owned))
+        update_daily_summary(conn, user_id, removed=[row._mapping])
+        return bump_data_version(user_id, conn), [Task(**row._mapping).to_dict()]
+
+    version, deleted = run_write(delete_task)
+    user_changed(user_id, version)
+    if deleted:
+        publish_tasks(user_id, version, 'deleted', deleted)
     return redirect("/")
 
+
+def upgrade_password_hash(user_id, password):
+    """Re-hash with the current PASSWORD_HASH_METHOD after a successful login."""
+    try:
+        password_hash = password_hasher.generate(password)
+    except passwords.HashingBusy:
+        return  # try again on a later login
+    users = User.__table__
+    run_write(lambda conn: conn.execute(
+        users.update().where(users.c.id == user_id).values(password=password_hash)), directory=True)
+
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     username_invalid = False
@@ -484,19 +2110,22 @@ def login():
     if request.method == "POST":
         username = request.form["username"]
         password = request.form["password"]
+        admit_attempt(username)
         user = User.query.filter_by(username=username).first()
 
         if not user:
             username_invalid = True
-        elif not check_password_hash(user.password, password):
+        elif not verify_password(user.password, password):
             password_invalid = True
         else:
+            if password_hasher.needs_rehash(user.password):
+                upgrade_password_hash(user.id, password)
             login_user(user)
             return redirect("/")
 
         flash("Invalid username or password.")
 
-    return render_template_string(LOGIN_HTML, username_invalid=username_invalid, password_invalid=password_invalid)
+    return render_page('login.html', username_invalid=username_invalid, password_invalid=password_invalid)
 
 
 @app.route("/signup", methods=["GET", "POST"])
@@ -504,13 +2133,30 @@ def signup():
     if request.method == "POST":
         username = request.form["username"]
         password = request.form["password"]
-        if User.query.filter_by(username=username).first():
+        admit_attempt()
+        users = User.__table__
+        password_hash = hash_password(password)
+
+        def create_user(conn):
+            # Check and insert in one write transaction so concurrent
+            # signups for the same name can't both pass the check.
+            if conn.execute(db.select(users.c.id).where(users.c.username == username)).first():
+                return None
+            user_id = conn.execute(users.insert().values(username=username, password=password_hash,
+                                                         description='', data_version=0)).inserted_primary_key[0]
+            shard = router.home(user_id)
+            conn.execute(users.update().where(users.c.id == user_id).values(shard=shard))
+            return user_id, shard
+
+        created = run_write(create_user, directory=True)
+        if not created:
             flash("Username exists")
             return redirect("/signup")
-        db.session.add(User(username=username, password=generate_password_hash(password)))
-        db.session.commit()
+        user_id, shard = created
+        if shard is not shards.MAIN:
+            ensure_shard_user(user_id, shard)
         return redirect("/login")
-    return render_template_string(SIGNUP_HTML)
+    return render_page('signup.html')
 
 @app.route("/logout")
 @login_required
@@ -527,17 +2173,74 @@ def profile():
         new_username = request.form["username"]
         new_description = request.form["description"]
 
-        # Prevent duplicate usernames
-        if new_username != current_user.username and User.query.filter_by(username=new_username).first():
+        users = User.__table__
+        user_id = current_user.id
+
+        def update_profile(conn):
+            # Prevent duplicate usernames
+            taken = conn.execute(db.select(users.c.id).where(
+                users.c.username == new_username, users.c.id != user_id)).first()
+            if taken:
+                return False
+            conn.execute(users.update().where(users.c.id == user_id).values(
+                username=new_username, description=new_description))
+            return True
+
+        if not run_write(update_profile, directory=True):
             flash("Username already taken!", "danger")
         else:
-            current_user.username = new_username
-            current_user.description = new_description
-            db.session.commit()
+            # The dashboard shows the description, so its cached copy goes.
+            version = run_write(lambda conn: bump_data_version(user_id, conn))
+            user_changed(user_id, version)
             flash("Profile updated successfully!", "success")
             return redirect("/profile")
 
-    return render_template_string(PROFILE_HTML, user=current_user)
+    return render_page('profile.html', user=current_user)
+
+
+@app.route("/export")
+@login_required
+def export_tasks():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in transfer.FORMATS:
+        abort(400)
+    user_id = current_user.id
+
+    def records():
+        # Live tasks, then the archive.  yield_per fetches and converts rows
+        # in batches while the response streams, so memory stays flat
+        # however many tasks the account has.
+        for model in (Task, ArchivedTask):
+            query = (model.query.filter_by(user_id=user_id)
+                     .order_by(model.due_date, model.id)
+                     .yield_per(app.config['EXPORT_BATCH_SIZE']))
+            for task in query:
+                yield task.to_dict()
+
+    lines = transfer.export_lines(records(), fmt)
+    response = app.response_class(stream_with_context(lines), mimetype=transfer.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=tasks.{fmt}'
+    return response
+
+
+@app.route("/import", methods=["POST"])
+@login_required
+def import_tasks_form():
+    upload = request.files.get('file')
+    fmt = upload and transfer.format_for(upload.filename or '', upload.mimetype)
+    if fmt is None:
+        flash("Choose a .csv or .jsonl file to import.", "danger")
+        return redirect("/profile")
+    errors = []
+    for event in import_tasks(transfer.read_records(upload.stream, fmt), current_user.id):
+        if 'error' in event:
+            errors.append(event)
+    flash(f"Imported {event['imported']} tasks.", "success" if not errors else "warning")
+    for error in errors[:5]:
+        flash(f"Line {error['line']}: {error['error']}", "danger")
+    if len(errors) > 5:
+        flash(f"...and {len(errors) - 5} more rows were skipped.", "danger")
+    return redirect("/profile")
 
 
 @app.route("/status")
@@ -545,6 +2248,35 @@ def status():
     return "OK", 200
 
 
+@app.route("/metrics")
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(404)
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+@app.route("/admin/backup", methods=["POST"])
+def admin_backup():
+    token = app.config['BACKUP_TOKEN']
+    given = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(given, f'Bearer {token}'):
+        abort(404)
+    if db.engine.url.get_backend_name() != 'sqlite':
+        abort(404)
+    # Throttled page-by-page copy, so this is safe to call while serving.
+    full = request.args.get('full') == '1'
+    entry = backup.snapshot(db.engine.url.database, app.config['BACKUP_DIR'], full=full)
+    # Each shard is its own file with its own backup chain.  The copies are
+    # not taken at one instant, so a user moved meanwhile may be in two.
+    if router.count:
+        entry['shards'] = [
+            backup.snapshot(router.engine(shard).url.database,
+                            os.path.join(app.config['BACKUP_DIR'], f'shard{shard}'), full=full)
+            for shard in range(router.count)]
+    return jsonify(entry)
+
+
 @app.route('/forgot-password', methods=['GET', 'POST'])
 def forgot_password():
     if request.method == 'POST':
@@ -556,62 +2288,373 @@ def forgot_password():
             flash('Passwords do not match!', 'danger')
             return redirect('/forgot-password')
 
-        user = User.query.filter_by(username=username).first()
-        if user:
-            user.password = generate_password_hash(new_password)
-            db.session.commit()
+        admit_attempt(username)
+        users = User.__table__
+        password_hash = hash_password(new_password)
+
+        def reset_password(conn):
+            row = conn.execute(db.select(users.c.id).where(users.c.username == username)).first()
+            if row:
+                conn.execute(users.update().where(users.c.id == row.id).values(password=password_hash))
+            return row and row.id
+
+        user_id = run_write(reset_password, directory=True)
+        if user_id:
+            user_changed(user_id)
             flash('Password reset successful! Please login.', 'success')
             return redirect('/login')
         else:
             flash('User not found.', 'danger')
             return redirect('/forgot-password')
 
-    return render_template_string('''
-    <!DOCTYPE html>
-    <html><head><title>Reset Password</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet"></head>
-    <body class="d-flex align-items-center justify-content-center vh-100 bg-light">
-        <div class="card p-4" style="max-width: 400px;">
-            <h4 class="text-center mb-3">🔐 Reset Your Password</h4>
-            <form method="POST">
-                <input type="text" name="username" class="form-control mb-3" placeholder="Enter your username" required>
-                <div class="input-group mb-3">
-    <input type="password" name="password" class="form-control" placeholder="New password" id="newPassword" required>
-    <span class="input-group-text" onclick="togglePassword('newPassword', this)">👁️</span>
-</div>
-
-<div class="input-group mb-3">
-    <input type="password" name="confirm_password" class="form-control" placeholder="Confirm password" id="confirmPassword" required>
-    <span class="input-group-text" onclick="togglePassword('confirmPassword', this)">👁️</span>
-</div>
-
-<script>
-function togglePassword(fieldId, icon) {
-    const input = document.getElementById(fieldId);
-    if (input.type === "password") {
-        input.type = "text";
-        icon.textContent = "🙈";
-    } else {
-        input.type = "password";
-        icon.textContent = "👁️";
-    }
-}
-</script>
-
-                <button type="submit" class="btn btn-primary w-100">Reset Password</button>
-            </form>
-            <a href="/login" class="d-block mt-3 text-center">Back to login</a>
-        </div>
-    </body></html>
-    ''')
+    return render_page('forgot_password.html')
+
+
+# ---------------------------------------------------------------------------
+# JSON API
+#
+# Batch endpoints validate every item up front, then apply the whole batch
+# in one run_write() transaction with a single version bump.
+# ---------------------------------------------------------------------------
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@app.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify(error=error.message), error.status
+
+
+def api_login_required(view):
+    # flask_login's decorator redirects to the login page, which is no use
+    # to a script; answer with a JSON 401 instead.
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not current_user.is_authenticated:
+            raise ApiError('authentication required', 401)
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def api_payload(key):
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get(key), list):
+        raise ApiError(f'expected a JSON object with a list under "{key}"')
+    items = payload[key]
+    if len(items) > app.config['API_MAX_BATCH']:
+        raise ApiError(f'at most {app.config["API_MAX_BATCH"]} items per request')
+    return items
+
+
+def api_ids():
+    ids = api_payload('ids')
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise ApiError('"ids" must be a list of integers')
+    return set(ids)
+
+
+def task_values_from_json(item, user_id, now):
+    if not isinstance(item, dict):
+        raise ApiError('each task must be an object')
+    text = item.get('text')
+    if not isinstance(text, str) or not text.strip() or len(text) > 200:
+        raise ApiError('task text must be 1-200 characters')
+    priority = item.get('priority')
+    priority = PRIORITY_LEVELS.get(priority) if isinstance(priority, str) else None
+    if priority is None:
+        raise ApiError('priority must be one of ' + ', '.join(PRIORITY_LEVELS))
+    due_date = item.get('due_date')
+    due_date = _parse_date(due_date) if isinstance(due_date, str) else None
+    if due_date is None:
+        raise ApiError('due_date must be an ISO date (YYYY-MM-DD)')
+    return dict(text=text, priority=priority, due_date=due_date, completed=False,
+                time=now.time().replace(microsecond=0), user_id=user_id)
+
+
+def task_values_from_record(record, user_id, now):
+    """Like task_values_from_json, but keeps an imported task's state and time."""
+    values = task_values_from_json(record, user_id, now)
+    completed = record.get('completed')
+    if isinstance(completed, str):
+        completed = completed.strip().lower()
+    if completed not in (None, ''):
+        if not isinstance(completed, (bool, str)) or completed not in (True, False, 'true', 'false', '1', '0'):
+            raise ApiError('completed must be true or false')
+        values['completed'] = completed in (True, 'true', '1')
+    when = record.get('time')
+    if when not in (None, ''):
+        try:
+            if not isinstance(when, str):
+                raise ValueError(when)
+            values['time'] = dt_time.fromisoformat(when)
+        except ValueError:
+            raise ApiError('time must be an ISO time (HH:MM or HH:MM:SS)') from None
+    return values
+
+
+def insert_tasks(rows, user_id):
+    tasks = Task.__table__
+
+    def insert(conn):
+        # A list of parameter sets runs as one executemany.
+        conn.execute(tasks.insert(), rows)
+        update_daily_summary(conn, user_id, added=rows)
+        return bump_data_version(user_id, conn)
+
+    # Once a streamed response has started its session cookie is already
+    # sent, but the cached user still has to go after every chunk.
+    user_changed(user_id, run_write(insert))
+    return len(rows)
+
+
+def import_tasks(records, user_id):
+    """Insert parsed upload records for a user, yielding progress events.
+
+    Valid rows are committed in chunks of IMPORT_CHUNK_SIZE, so a large file
+    never sits in one long write transaction and a failure part-way keeps
+    the chunks already committed.  Events are ``{'line', 'error'}`` for each
+    skipped row, ``{'imported'}`` after each chunk, and a final
+    ``{'done', 'imported', 'errors'}``.
+    """
+    now = datetime.now()
+    chunk_size = app.config['IMPORT_CHUNK_SIZE']
+    max_errors = app.config['IMPORT_MAX_ERRORS']
+    imported = errors = 0
+    rows = []
+    for line, record, error in records:
+        if error is None:
+            try:
+                rows.append(task_values_from_record(record, user_id, now))
+            except ApiError as invalid:
+                error = invalid.message
+        if error is not None:
+            errors += 1
+            yield {'line': line, 'error': error}
+            if errors >= max_errors:
+                yield {'line': line, 'error': f'stopped after {errors} errors'}
+                break
+        elif len(rows) >= chunk_size:
+            imported += insert_tasks(rows, user_id)
+            rows = []
+            yield {'imported': imported}
+    if rows:
+        imported += insert_tasks(rows, user_id)
+        yield {'imported': imported}
+    yield {'done': True, 'imported': imported, 'errors': errors}
+
+
+@app.route("/api/tasks", methods=["GET"])
+@api_login_required
+def api_list_tasks():
+    filters = DashboardFilters.from_args(request.args)
+    expand_window(current_user.id, filters)
+    version = current_data_version()
+    tasks, next_after, next_before = dashboard_window(current_user.id, filters)
+    return jsonify(tasks=[t.to_dict() for t in tasks], next_after=next_after, next_before=next_before,
+                   version=version)
+
+
+@app.route("/api/tasks/history", methods=["GET"])
+@api_login_required
+def api_history():
+    before = _parse_history_cursor(request.args.get('before'))
+    version = current_data_version()
+    tasks, next_before = history_window(current_user.id, before)
+    return jsonify(tasks=[t.to_dict() for t in tasks], next_before=next_before, version=version)
+
+
+@app.route("/api/reminders", methods=["GET"])
+@api_login_required
+def api_reminders():
+    reminders = (Reminder.query.filter_by(user_id=current_user.id, delivered_at=None)
+                 .order_by(Reminder.remind_at).limit(app.config['API_MAX_BATCH']).all())
+    return jsonify(reminders=[r.to_dict() for r in reminders])
+
+
+@app.route("/api/reminders/ack", methods=["POST"])
+@api_login_required
+def api_ack_reminders():
+    ids = api_ids()
+    user_id = current_user.id
+    reminders = Reminder.__table__
+
+    def ack(conn):
+        return conn.execute(reminders.update().where(
+            reminders.c.id.in_(ids), reminders.c.user_id == user_id, reminders.c.delivered_at.is_(None),
+        ).values(delivered_at=datetime.now())).rowcount
+
+    return jsonify(acknowledged=run_write(ack))
+
+
+@app.route("/api/tasks/search", methods=["GET"])
+@api_login_required
+def api_search_tasks():
+    if not search_enabled():
+        raise ApiError('search is not available on this server', 501)
+    # SQLite reads a negative LIMIT as no limit at all.
+    limit = max(1, min(request.args.get('limit', app.config['SEARCH_LIMIT'], type=int),
+                       app.config['SEARCH_LIMIT']))
+    results = search_tasks(current_user.id, request.args.get('q', ''), limit)
+    return jsonify(tasks=[t.to_dict() for t in results])
+
+
+@app.route("/api/tasks", methods=["POST"])
+@api_login_required
+def api_create_tasks():
+    now = datetime.now()
+    user_id = current_user.id
+    rows = [task_values_from_json(item, user_id, now) for item in api_payload('tasks')]
+    tasks = Task.__table__
+
+    def create(conn):
+        ids = insert_returning_ids(conn, tasks, rows)
+        created = [Task(id=id, **values).to_dict() for id, values in zip(ids, rows)]
+        if not created:
+            return None, created
+        update_daily_summary(conn, user_id, added=rows)
+        return bump_data_version(user_id, conn), created
+
+    version, created = run_write(create)
+    user_changed(user_id, version)
+    if created:
+        publish_tasks(user_id, version, 'created', created)
+    return jsonify(tasks=created), 201
+
+
+@app.route("/api/tasks/import", methods=["POST"])
+@api_login_required
+def api_import_tasks():
+    fmt = request.args.get('format') or transfer.format_for(mimetype=request.mimetype)
+    if fmt not in transfer.FORMATS:
+        raise ApiError('send text/csv or application/x-ndjson, or pass ?format=csv|jsonl')
+    user_id = current_user.id
+    events = import_tasks(transfer.read_records(request.stream, fmt), user_id)
+    lines = (json.dumps(event) + '\n' for event in events)
+    return app.response_class(stream_with_context(lines), mimetype='application/x-ndjson')
+
+
+@app.route("/api/tasks/toggle", methods=["POST"])
+@api_login_required
+def api_toggle_tasks():
+    ids = api_ids()
+    user_id = current_user.id
+    tasks = Task.__table__
+    owned = db.and_(tasks.c.user_id == user_id, tasks.c.id.in_(ids))
+
+    def toggle(conn):
+        if not ids:
+            return None, []
+        conn.execute(tasks.update().where(owned).values(completed=db.not_(tasks.c.completed)))
+        rows = [row._mapping for row in conn.execute(tasks.select().where(owned))]
+        if not rows:
+            return None, []
+        update_daily_summary(conn, user_id, toggled=rows)
+        return bump_data_version(user_id, conn), [Task(**row).to_dict() for row in rows]
+
+    version, changed = run_write(toggle)
+    user_changed(user_id, version)
+    if changed:
+        publish_tasks(user_id, version, 'updated', changed)
+    return jsonify(tasks=changed)
+
+
+@app.route("/api/tasks/delete", methods=["POST"])
+@api_login_required
+def api_delete_tasks():
+    ids = api_ids()
+    user_id = current_user.id
+    tasks = Task.__table__
+    owned = db.and_(tasks.c.user_id == user_id, tasks.c.id.in_(ids))
+
+    def delete_tasks(conn):
+        if not ids:
+            return None, []
+        rows = [row._mapping for row in conn.execute(tasks.select().where(owned))]
+        if not rows:
+            return None, []
+        conn.execute(tasks.delete().where(owned))
+        update_daily_summary(conn, user_id, removed=rows)
+        return bump_data_version(user_id, conn), [Task(**row).to_dict() for row in rows]
+
+    version, deleted = run_write(delete_tasks)
+    user_changed(user_id, version)
+    if deleted:
+        publish_tasks(user_id, version, 'deleted', deleted)
+    return jsonify(tasks=deleted)
 
 
 with app.app_context():
+    # Engines are only configured here; nothing connects until a request,
+    # command or init_db() needs the database.
+    for shard in router.shards():
+        if SQLITE_PRODUCTION:
+            sqlite_mode.configure_engine(router.engine(shard), app.config)
+    metrics.init_app(app, db.engine)
+    for shard in range(router.count):
+        metrics.instrument(router.engine(shard))
+    # Registered after metrics so request latency includes compression.
+    compression.init_app(app)
+
+
+def init_db():
+    """Create or upgrade the schema of the main database and every shard.
+
+    Run once per deploy, before the workers start (``flask init-db``); it
+    is safe to repeat.  Workers never do this themselves, so booting one
+    doesn't touch the database.
+    """
     # TEMPORARY FIX: Drop and recreate all tables
     #db.drop_all()
-    db.create_all()
+    # Just the main database: shard files get the per-user tables below.
+    db.create_all(bind=None)
+    if db.engine.url.get_backend_name() == 'sqlite':
+        # Typed task table, added columns and indexes for older databases.
+        migrate.migrate(db.engine.url.database, log=app.logger.info)
+    with db.engine.begin() as conn:
+        # First start after DailySummary was added: fill it from the tasks.
+        if (conn.execute(db.select(DailySummary.user_id).limit(1)).first() is None
+                and conn.execute(db.select(Task.id).limit(1)).first() is not None):
+            rebuild_daily_summary(conn)
+    for shard in router.shards():
+        engine = router.engine(shard)
+        if shard is not shards.MAIN:
+            # Shards hold stub users plus the per-user tables.
+            db.Model.metadata.create_all(engine, tables=[User.__table__] + [
+                model.__table__ for model in SHARDED_MODELS])
+        with engine.begin() as conn:
+            if search.available(conn):
+                search.install(conn)
+    search_enabled.cache_clear()
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the tables, or bring an existing database up to date."""
+    init_db()
+    click.echo('database ready')
+
+
+def create_app():
+    """Return the app ready to serve; gunicorn runs ``main:create_app()``.
+
+    Routes are defined when this module is imported, which opens no
+    database connection and does no slow work, so ``flask`` commands and
+    tests start quickly.  This does the per-process warm-up (fingerprinting
+    and compressing assets, compiling the busiest templates) before the
+    first request rather than during it.  With ``--preload`` it runs once in
+    the gunicorn master and the workers share the result.
+    """
+    asset_manifest.load()
+    warm_templates(HOT_TEMPLATES)
+    return app
 
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 10000))
-    app.run(host="0.0.0.0", port=port, debug=True)
+    with app.app_context():
+        init_db()
+    create_app().run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,142 @@
+"""Request instrumentation exposed in the Prometheus text format.
+
+``init_app`` hooks Flask's request handlers and SQLAlchemy's cursor events
+so every request records its latency, how many SQL statements it ran and
+how long they took.  Other code times its own work with :func:`timed`
+(template rendering, password hashing).  Numbers are per process: with
+several gunicorn workers each one reports its own.
+
+Set ``SLOW_REQUEST_MS`` to log every request slower than that, together
+with the statements it ran.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # bucket counts, then sum, then total count
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted(self._series.items())
+            items = [(key, list(series)) for key, series in items]
+        for key, series in items:
+            labels = ','.join(f'{n}="{_escape(v)}"' for n, v in zip(self.labels, key))
+            prefix = labels + ',' if labels else ''
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {series[-1]}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_latency = Histogram('http_request_duration_seconds', 'Request latency.',
+                            ('route', 'method', 'status'))
+request_queries = Histogram('http_request_sql_queries', 'SQL statements per request.',
+                            ('route',), COUNT_BUCKETS)
+request_sql_time = Histogram('http_request_sql_seconds', 'Time spent in SQL per request.',
+                             ('route',))
+template_render = Histogram('template_render_seconds', 'Template render time.', ('template',))
+password_hash = Histogram('password_hash_seconds', 'Password hashing time.', ('op',))
+
+REGISTRY = [request_latency, request_queries, request_sql_time, template_render, password_hash]
+
+
+@contextmanager
+def timed(histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def render():
+    return '\n'.join(h.render() for h in REGISTRY) + '\n'
+
+
+def init_app(app, engine):
+    slow_ms = app.config.get('SLOW_REQUEST_MS', 0)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+        g.sql_statements = [] if slow_ms else None
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_latency.observe(elapsed, route=route, method=request.method,
+                                status=response.status_code)
+        request_queries.observe(g.sql_count, route=route)
+        request_sql_time.observe(g.sql_time, route=route)
+        if slow_ms and elapsed * 1000 >= slow_ms:
+            queries = '\n'.join(f'  {ms:.1f}ms {sql}' for ms, sql in g.sql_statements)
+            app.logger.warning('slow request %s %s: %.1fms, %d queries (%.1fms)\n%s',
+                               request.method, request.full_path, elapsed * 1000,
+                               g.sql_count, g.sql_time * 1000, queries)
+        return response
+
+    instrument(engine)
+
+
+def instrument(engine):
+    """Count and time the queries run on ``engine`` against the current request."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'handle_error')
+    def drop_query_timer(context):
+        starts = context.connection.info.get('query_start') if context.connection else None
+        if starts:
+            starts.pop()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def record_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        # Writes done by the group-commit thread have no request to charge.
+        if not has_request_context() or 'sql_count' not in g:
+            return
+        g.sql_count += 1
+        g.sql_time += elapsed
+        if g.sql_statements is not None:
+            g.sql_statements.append((elapsed * 1000, ' '.join(statement.split())[:500]))
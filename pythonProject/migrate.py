@@ -0,0 +1,176 @@
+"""Online migration of the task table to the typed schema.
+
+Older databases store ``due_date`` and ``time`` as free-form strings and
+``priority`` as 'High'/'Medium'/'Low', with no index on ``user_id``.  This
+script copies rows into a typed shadow table in small batches while the app
+keeps serving, mirrors concurrent writes with triggers, and swaps the tables
+in one short transaction at the end.  Columns added to existing tables since
+(such as ``user.data_version``) are created with cheap ``ALTER TABLE ADD``.
+
+    python migrate.py [path/to/tasks.db] [--batch-size 500] [--pause 0.05]
+
+Running it against an already migrated database is a no-op.
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tasks.db')
+
+COLUMNS = 'id, text, priority, due_date, completed, time, user_id'
+
+# Expressions turning a legacy row (prefixed with ``{p}``) into typed values.
+# Anything that does not look like a date or time becomes NULL rather than
+# a value the ORM cannot parse.
+CONVERTED = '''
+    {p}id,
+    {p}text,
+    CASE {p}priority
+        WHEN 'High' THEN 3 WHEN 'Medium' THEN 2 WHEN 'Low' THEN 1
+        ELSE NULLIF(CAST({p}priority AS INTEGER), 0)
+    END,
+    CASE WHEN {p}due_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*'
+         THEN substr({p}due_date, 1, 10) END,
+    {p}completed,
+    CASE WHEN {p}time GLOB '[0-9][0-9]:[0-9][0-9]:[0-9][0-9]*'
+         THEN {p}time END,
+    {p}user_id
+'''
+
+CREATE_SHADOW = '''
+CREATE TABLE IF NOT EXISTS task_new (
+    id INTEGER NOT NULL,
+    text VARCHAR(200) NOT NULL,
+    priority SMALLINT,
+    due_date DATE,
+    completed BOOLEAN,
+    time TIME,
+    user_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES user (id)
+)
+'''
+
+TRIGGERS = {
+    'task_migrate_insert': '''
+        CREATE TRIGGER IF NOT EXISTS task_migrate_insert AFTER INSERT ON task
+        BEGIN
+            INSERT OR REPLACE INTO task_new ({cols}) SELECT {new};
+        END''',
+    'task_migrate_update': '''
+        CREATE TRIGGER IF NOT EXISTS task_migrate_update AFTER UPDATE ON task
+        BEGIN
+            INSERT OR REPLACE INTO task_new ({cols}) SELECT {new};
+        END''',
+    'task_migrate_delete': '''
+        CREATE TRIGGER IF NOT EXISTS task_migrate_delete AFTER DELETE ON task
+        BEGIN
+            DELETE FROM task_new WHERE id = old.id;
+        END''',
+}
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_task_user_due_completed '
+    'ON task (user_id, due_date, completed, time)',
+    'CREATE INDEX IF NOT EXISTS ix_task_user_completed_priority '
+    'ON task (user_id, completed, priority)',
+    'CREATE INDEX IF NOT EXISTS ix_task_open_due '
+    'ON task (due_date) WHERE completed = 0',
+]
+
+
+# (table, column, definition) for columns added after a table first shipped.
+ADDED_COLUMNS = [
+    ('user', 'data_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('task', 'rule_id', 'INTEGER REFERENCES recurring_rule (id)'),
+    ('user', 'shard', 'SMALLINT'),
+    ('archived_task', 'task_id', 'INTEGER'),
+]
+
+
+def connect(path):
+    # Autocommit mode: every batch below opens and closes its own
+    # transaction so the app's writers only ever wait for one batch.
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA busy_timeout = 30000')
+    return conn
+
+
+def is_migrated(conn):
+    types = {row[1]: row[2].upper() for row in conn.execute('PRAGMA table_info(task)')}
+    return types.get('priority') == 'SMALLINT' and types.get('due_date') == 'DATE'
+
+
+def add_missing_columns(conn, log=print):
+    for table, column, definition in ADDED_COLUMNS:
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+        if existing and column not in existing:
+            conn.execute(f'ALTER TABLE "{table}" ADD COLUMN {column} {definition}')
+            log(f'added {table}.{column}')
+
+
+def start(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    conn.execute(CREATE_SHADOW)
+    for sql in TRIGGERS.values():
+        conn.execute(sql.format(cols=COLUMNS, new=CONVERTED.format(p='new.')))
+    conn.execute('COMMIT')
+
+
+def copy_batches(conn, batch_size, pause, log=print):
+    last_id = 0
+    max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM task').fetchone()[0]
+    copy = (f'INSERT OR IGNORE INTO task_new ({COLUMNS}) '
+            f'SELECT {CONVERTED.format(p="")} FROM task WHERE id > ? AND id <= ?')
+    while last_id < max_id:
+        upper = last_id + batch_size
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(copy, (last_id, upper))
+        conn.execute('COMMIT')
+        last_id = upper
+        log(f'copied ids up to {min(last_id, max_id)} / {max_id}')
+        time.sleep(pause)
+
+
+def swap(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    # Rows inserted after copy_batches read max_id were mirrored by the
+    # insert trigger, so the shadow table is complete at this point.
+    for name in TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+    conn.execute('ALTER TABLE task RENAME TO task_old')
+    conn.execute('ALTER TABLE task_new RENAME TO task')
+    conn.execute('DROP TABLE task_old')
+    for sql in INDEXES:
+        conn.execute(sql)
+    conn.execute('COMMIT')
+
+
+def migrate(path=DEFAULT_DB, batch_size=500, pause=0.05, log=print):
+    conn = connect(path)
+    try:
+        add_missing_columns(conn, log)
+        if is_migrated(conn):
+            for sql in INDEXES:
+                conn.execute(sql)
+            log('task table already migrated')
+            return
+        start(conn)
+        copy_batches(conn, batch_size, pause, log)
+        swap(conn)
+        # The typed table is built from the original columns only.
+        add_missing_columns(conn, log)
+        log('task table migrated')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('database', nargs='?', default=DEFAULT_DB)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--pause', type=float, default=0.05,
+                        help='seconds to sleep between batches')
+    args = parser.parse_args()
+    migrate(args.database, args.batch_size, args.pause)
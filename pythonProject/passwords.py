@@ -0,0 +1,99 @@
+"""Password hashing off the request thread, plus login admission control.
+
+PBKDF2 is deliberately slow, so running it inline lets a burst of logins
+(or a credential-stuffing run) tie up every gunicorn worker.  Hashes are
+computed in a small process pool instead, with a hard cap on how many may be
+queued or running: past that cap callers get :class:`HashingBusy` straight
+away and the app answers 429 rather than queueing forever.  Under gevent
+workers the pool is made of threads instead (see ``serving``).  The pool's
+processes start from a forkserver, which imports the ``__main__`` script
+again, so a script that hashes through it needs an
+``if __name__ == '__main__':`` guard (or ``HASH_WORKERS=0``).
+
+:class:`RateLimiter` is a per-key token bucket used to admit login attempts
+per username and per client IP before any hashing happens.  Both the pool
+and the buckets are per gunicorn worker.
+"""
+import concurrent.futures
+import os
+import threading
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import serving
+from cache import LRUCache
+
+
+class HashingBusy(Exception):
+    """The hashing pool is at its queue depth; retry later."""
+
+
+class PasswordHasher:
+    def __init__(self, method, workers=2, queue_depth=8, timeout=10):
+        self.method = method
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self._pid = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+
+    def _ensure_pool(self):
+        # A pool inherited through fork has no live worker processes.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = serving.executor(self.workers)
+                self._slots = threading.BoundedSemaphore(self.queue_depth)
+                self._pid = os.getpid()
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        self._ensure_pool()
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            raise HashingBusy() from None
+
+    def generate(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        # Werkzeug hashes start with the method, e.g. "pbkdf2:sha256:260000$salt$hash".
+        return pwhash.split('$', 1)[0] != self.method
+
+
+class RateLimiter:
+    """Token bucket per key: ``burst`` attempts at once, refilled at ``per_minute``."""
+
+    def __init__(self, per_minute, burst, max_keys=100000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self._buckets = LRUCache(max_keys)
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            self._buckets.set(key, (tokens - 1 if allowed else tokens, now))
+            return allowed
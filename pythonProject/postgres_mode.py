@@ -0,0 +1,119 @@
+"""PostgreSQL: pooled engine options and server-side prepared statements.
+
+Point ``DATABASE_URL`` at a ``postgresql://`` database and the app runs on
+a pooled psycopg2 engine: ``PG_POOL_SIZE`` connections kept open per
+worker (plus ``PG_POOL_OVERFLOW``), checked with a ping before use and
+recycled after ``PG_POOL_RECYCLE`` seconds, each with a
+``statement_timeout`` so one slow query can't hold a connection forever.
+Multi-row inserts and updates go through psycopg2's ``execute_values`` /
+``execute_batch`` helpers, one round trip per page instead of one per row.
+
+The handful of statements every page view runs are registered with
+:class:`PreparedStatements`, which ``PREPARE``s each once per connection
+and then only sends ``EXECUTE name(...)``, so the server skips parsing and
+planning them on every request.
+"""
+import re
+
+from sqlalchemy.types import NullType
+
+_PARAM = re.compile(r'%\((\w+)\)s')
+
+
+def database_url(url):
+    """Accept the ``postgres://`` scheme some hosts hand out; SQLAlchemy
+    1.4 only knows ``postgresql://``."""
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(config):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for a pooled psycopg2 engine."""
+    return {
+        'pool_size': config['PG_POOL_SIZE'],
+        'max_overflow': config['PG_POOL_OVERFLOW'],
+        'pool_timeout': config['PG_POOL_TIMEOUT'],
+        'pool_recycle': config['PG_POOL_RECYCLE'],
+        # A connection the server or a proxy dropped while it sat in the
+        # pool is replaced on checkout instead of failing the request.
+        'pool_pre_ping': config['PG_POOL_PRE_PING'],
+        # execute_values for executemany INSERTs, execute_batch for
+        # UPDATE/DELETE.
+        'executemany_mode': 'values_plus_batch',
+        'executemany_values_page_size': config['PG_BATCH_PAGE_SIZE'],
+        'executemany_batch_page_size': config['PG_BATCH_PAGE_SIZE'],
+        'connect_args': {
+            'application_name': 'task-manager',
+            'options': f"-c statement_timeout={int(config['PG_STATEMENT_TIMEOUT_MS'])}",
+        },
+    }
+
+
+def cooperative_waits():
+    """Let psycopg2 wait on sockets through ``select``, which gevent patches,
+    so a query blocks only its own greenlet rather than the whole worker."""
+    import psycopg2.extensions
+    import psycopg2.extras
+    psycopg2.extensions.set_wait_callback(psycopg2.extras.wait_select)
+
+
+class PreparedStatements:
+    """Named Core statements that run as prepared statements on PostgreSQL.
+
+    Statements name their parameters with ``bindparam``.  ``execute(conn,
+    name, params)`` prepares the statement the first time a connection runs
+    it and sends only ``EXECUTE`` after that; on other databases, or with
+    ``enabled`` off (say behind PgBouncer in transaction mode, where a
+    session's prepared statements don't follow it), it just executes the
+    statement.  Rows come back with psycopg2's own types, without
+    SQLAlchemy's result processing, so keep to columns psycopg2 converts.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._statements = {}
+        self._compiled = {}
+
+    def add(self, name, stmt):
+        self._statements[name] = stmt
+        return stmt
+
+    def __getitem__(self, name):
+        return self._statements[name]
+
+    def execute(self, conn, name, params):
+        if not self.enabled or conn.dialect.name != 'postgresql':
+            return conn.execute(self._statements[name], params)
+        sql, types, order, defaults = self._compile(conn.dialect, name)
+        # The info dict goes away with the DBAPI connection, and a
+        # prepared statement lives exactly as long as its session.
+        prepared = conn.connection.info.setdefault('prepared_statements', set())
+        if name not in prepared:
+            conn.exec_driver_sql(f'PREPARE {name}{types} AS {sql}')
+            prepared.add(name)
+        args = tuple(params[key] if key in params else defaults[key] for key in order)
+        placeholders = f"({', '.join(['%s'] * len(args))})" if args else ''
+        return conn.exec_driver_sql(f'EXECUTE {name}{placeholders}', args)
+
+    def _compile(self, dialect, name):
+        if name not in self._compiled:
+            compiled = self._statements[name].compile(dialect=dialect)
+            types = {key: bind.type for bind, key in compiled.bind_names.items()}
+            order = []
+
+            def number(match):
+                if match.group(1) not in order:
+                    order.append(match.group(1))
+                return f'${order.index(match.group(1)) + 1}'
+
+            sql = _PARAM.sub(number, compiled.string).replace('%%', '%')
+            type_names = ', '.join(
+                'unknown' if isinstance(types[key], NullType)
+                else dialect.type_compiler.process(types[key])
+                for key in order)
+            type_names = f' ({type_names})' if order else ''
+            # Literal values in the statement become parameters too.
+            defaults = {key: value for key, value in compiled.params.items() if value is not None}
+            self._compiled[name] = (sql, type_names, order, defaults)
+        return self._compiled[name]
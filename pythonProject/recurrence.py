@@ -0,0 +1,27 @@
+"""Dates on which a recurring task falls.
+
+A rule repeats from its start date on one of the ``PATTERNS``; ``weekly``
+repeats on the start date's weekday.  Turning dates into task rows, and
+deciding how far ahead to do it, stays in ``main``.
+"""
+from datetime import timedelta
+
+PATTERNS = {
+    'daily': lambda start, day: True,
+    'weekdays': lambda start, day: day.weekday() < 5,
+    'weekly': lambda start, day: day.weekday() == start.weekday(),
+}
+LABELS = {'daily': 'Every day', 'weekdays': 'Every weekday', 'weekly': 'Every week'}
+
+
+def dates(pattern, start, after, until, end=None):
+    """Yield the days in (after, until] on which the rule falls, never
+    before ``start`` or past ``end``."""
+    falls_on = PATTERNS[pattern]
+    day = max(after + timedelta(days=1), start)
+    if end is not None:
+        until = min(until, end)
+    while day <= until:
+        if falls_on(start, day):
+            yield day
+        day += timedelta(days=1)
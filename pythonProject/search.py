@@ -0,0 +1,75 @@
+"""Full-text task search on SQLite FTS5.
+
+``task_fts`` holds each task's text plus an ``owner`` token (``u<user_id>``)
+and is kept in step with ``task`` by triggers.  Queries match the owner
+token and the search terms together, so FTS5 intersects the two posting
+lists instead of scanning other users' matches, and nothing falls back to a
+``LIKE '%...%'`` table scan.
+"""
+import re
+
+from sqlalchemy import text
+
+DDL = [
+    # prefix='2 3' keeps short prefix queries (search-as-you-type) index-only.
+    """CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5(
+        text, owner, prefix='2 3', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_insert AFTER INSERT ON task BEGIN
+        INSERT INTO task_fts (rowid, text, owner) VALUES (new.id, new.text, 'u' || new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_delete AFTER DELETE ON task BEGIN
+        DELETE FROM task_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_update AFTER UPDATE OF text, user_id ON task BEGIN
+        UPDATE task_fts SET text = new.text, owner = 'u' || new.user_id WHERE rowid = old.id;
+    END""",
+]
+
+SEARCH_SQL = text("""
+    SELECT task.* FROM task_fts JOIN task ON task.id = task_fts.rowid
+    WHERE task_fts MATCH :match AND task.user_id = :user_id
+    ORDER BY bm25(task_fts, 1.0, 0.0), task.id DESC
+    LIMIT :limit
+""")
+
+MAX_TERMS = 8
+
+
+def available(conn):
+    if conn.dialect.name != 'sqlite':
+        return False
+    try:
+        conn.exec_driver_sql('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+    except Exception:
+        return False
+    conn.exec_driver_sql('DROP TABLE temp.fts5_probe')
+    return True
+
+
+def installed(conn):
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'task_fts'").first() is not None
+
+
+def install(conn):
+    """Create the index and triggers; backfill existing tasks the first time."""
+    exists = installed(conn)
+    for statement in DDL:
+        conn.exec_driver_sql(statement)
+    if not exists:
+        conn.exec_driver_sql(
+            "INSERT INTO task_fts (rowid, text, owner) SELECT id, text, 'u' || user_id FROM task")
+
+
+def match_expression(user_id, query):
+    """Build an FTS5 query from free text: every word must match as a prefix.
+
+    Words are quoted, so FTS5 operators typed by the user are searched for
+    literally rather than interpreted.  Returns None if there is nothing to
+    search for.
+    """
+    words = re.findall(r'\w+', query)[:MAX_TERMS]
+    if not words:
+        return None
+    terms = ' '.join(f'"{word}"*' for word in words)
+    return f'owner : "u{int(user_id)}" AND text : ({terms})'
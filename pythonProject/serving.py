@@ -0,0 +1,37 @@
+"""What kind of gunicorn worker the app is running in.
+
+``gunicorn.conf.py`` picks the worker class from ``SERVE_MODE``.  Under
+gevent workers the standard library is monkey-patched, so sockets, locks,
+queues and sleeps already yield to other connections; the things that need
+care are the ones that block the whole process instead:
+
+* SQLite calls run in C and hold the worker for their duration, so keep
+  transactions short and let the pool (``SQLITE_POOL_SIZE``) queue
+  greenlets cooperatively rather than open a connection per request.
+* Password hashing is CPU-bound; it goes to real threads (``hashlib``
+  releases the GIL) instead of a process pool, which does not mix with
+  monkey-patching.
+"""
+import sys
+
+
+def using_gevent():
+    """True inside a monkey-patched gevent worker."""
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('socket')
+
+
+def executor(workers):
+    """An executor for CPU-bound work that suits the current worker type."""
+    if using_gevent():
+        from gevent.threadpool import ThreadPoolExecutor
+        return ThreadPoolExecutor(workers)
+    import concurrent.futures
+    import multiprocessing
+    # Workers already run threads (write queue, scheduler) when the pool
+    # starts, and forking then can hand the child a lock some other thread
+    # held; start the processes from a clean forkserver (spawn on Windows).
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method))
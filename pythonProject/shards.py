@@ -0,0 +1,136 @@
+"""Per-user sharding across several SQLite files.
+
+With ``SHARD_COUNT`` set, each user's tasks and everything hanging off them
+live in one of N shard files, configured as the SQLAlchemy binds
+``shard0``, ``shard1``...  Writers for users on different shards take
+different file locks, so write throughput grows with the shard count.
+
+The main database (``SQLALCHEMY_DATABASE_URI``) is the directory: its
+``user`` table is what logins and signups read, and each row's ``shard``
+column says where that user's data lives.  ``NULL`` (``MAIN``) means the
+main database itself, which is where everyone from before sharding stays
+until ``flask move-user``/``flask rebalance`` moves them.  Each shard keeps
+a stub ``user`` row per resident user, for foreign keys and for the
+``data_version`` that writes to the user's tasks bump.
+
+Routing follows the context rather than the model: :class:`RoutingSession`
+sends statements on the per-user tables to the shard of ``current()``,
+which is the logged-in user's unless ``using(shard)`` says otherwise.
+"""
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+from sqlalchemy.sql.util import find_tables
+
+MAIN = None
+_UNSET = object()
+
+
+class UserMoved(Exception):
+    """The user's rows are not on the shard the request looked at: they
+    were moved after this worker cached the user."""
+
+    def __init__(self, user_id):
+        super().__init__(f'user {user_id} is not on this shard')
+        self.user_id = user_id
+
+
+class ShardRouter:
+    def __init__(self):
+        self.count = 0
+        self.tables = frozenset()
+        self.db = None
+        self.app = None
+        self._default = lambda: MAIN
+        self._shard_by_engine = {}
+
+    def init_app(self, app, db, count, url_template, tables, default):
+        """Register the shard binds; ``tables`` names the per-user tables and
+        ``default()`` gives the shard of the current request's user."""
+        if count and not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+            raise RuntimeError('SHARD_COUNT only applies to SQLite databases')
+        self.count = count
+        self.tables = frozenset(tables)
+        self.db = db
+        self.app = app
+        self._default = default
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.update({self.bind_key(n): url_template.format(n=n) for n in range(count)})
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    def shards(self):
+        """Every place user data can live, the main database first."""
+        return [MAIN, *range(self.count)]
+
+    def home(self, user_id):
+        """The shard a user is placed on at signup and by ``rebalance``."""
+        return user_id % self.count if self.count else MAIN
+
+    @staticmethod
+    def bind_key(shard):
+        return None if shard is MAIN else f'shard{shard}'
+
+    def engine(self, shard):
+        engine = self.db.get_engine(self.app, bind=self.bind_key(shard))
+        self._shard_by_engine[engine] = shard
+        return engine
+
+    def shard_of(self, conn):
+        """The shard a connection (from ``engine()`` or the session) belongs to."""
+        return self._shard_by_engine.get(conn.engine, MAIN)
+
+    def connection(self, shard):
+        """The request session's connection to ``shard``."""
+        return self.db.session.connection(bind_arguments={'bind': self.engine(shard)})
+
+    def current(self):
+        if has_app_context() and 'shard' in g:
+            return g.shard
+        return self._default()
+
+    @contextmanager
+    def using(self, shard):
+        """Route per-user tables to ``shard`` for the duration of the block."""
+        previous = g.get('shard', _UNSET)
+        g.shard = shard
+        try:
+            yield
+        finally:
+            if previous is _UNSET:
+                g.pop('shard', None)
+            else:
+                g.shard = previous
+
+    def routes(self, mapper, clause):
+        if not self.count:
+            return False
+        if mapper is not None:
+            return mapper.local_table.name in self.tables
+        if clause is not None:
+            return any(getattr(table, 'name', None) in self.tables
+                       for table in find_tables(clause, include_crud=True))
+        return False
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        self.router = db.router
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.router.routes(mapper, clause):
+            return self.router.engine(self.router.current())
+        return super().get_bind(mapper, clause)
+
+
+class ShardedSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy whose session routes per-user tables through ``router``."""
+
+    def __init__(self, router, **kwargs):
+        self.router = router
+        super().__init__(**kwargs)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
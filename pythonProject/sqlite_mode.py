@@ -0,0 +1,142 @@
+"""SQLite production mode: connection pragmas and a group-committing writer.
+
+With ``SQLITE_MODE=production`` every pooled connection runs in WAL mode with
+``synchronous=NORMAL``, a busy timeout, a sized page cache and mmap, so
+readers in all gunicorn workers proceed while one writer commits.
+
+Small writes from request handlers go through :class:`WriteQueue`: a single
+writer thread per worker that collects whatever jobs arrive within a few
+milliseconds and commits them together in one ``BEGIN IMMEDIATE``
+transaction, each job inside its own savepoint so one failure doesn't undo
+the others.
+"""
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+def engine_options(config):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for a pooled, thread-shared SQLite engine."""
+    return {
+        # SQLAlchemy 1.4 defaults file databases to NullPool; reusing
+        # connections keeps each one's page cache and mmap warm.
+        'poolclass': QueuePool,
+        'pool_size': config['SQLITE_POOL_SIZE'],
+        'max_overflow': config['SQLITE_POOL_OVERFLOW'],
+        'pool_timeout': config['SQLITE_POOL_TIMEOUT'],
+        'connect_args': {
+            'check_same_thread': False,
+            'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+        },
+    }
+
+
+def configure_engine(engine, config):
+    pragmas = [
+        'PRAGMA synchronous = NORMAL',
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        # Negative values are KiB rather than pages.
+        f"PRAGMA cache_size = -{int(config['SQLITE_CACHE_KB'])}",
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_BYTES'])}",
+        'PRAGMA foreign_keys = ON',
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        # Take transaction control away from pysqlite so SAVEPOINT works
+        # and we decide between BEGIN and BEGIN IMMEDIATE ourselves.
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        # WAL sticks to the file, and switching needs every other connection
+        # gone, which fails when several workers open a new file at once
+        # (say a shard file on first start).  Only switch if still needed.
+        if cursor.execute('PRAGMA journal_mode').fetchone()[0] != 'wal':
+            cursor.execute('PRAGMA journal_mode = WAL')
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def do_begin(conn):
+        conn.exec_driver_sql(conn.get_execution_options().get('sqlite_begin', 'BEGIN'))
+
+
+class WriteQueue:
+    """Serialises a worker's writes through one connection and group-commits them.
+
+    ``submit(fn)`` blocks until ``fn(connection)`` has been committed and
+    returns its result (or raises its exception).
+    """
+
+    def __init__(self, get_engine, max_batch=64, max_delay=0.002, timeout=30):
+        self.get_engine = get_engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def _ensure_started(self):
+        # Threads don't survive fork, so each gunicorn worker starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            thread = threading.Thread(target=self._run, args=(self._queue,),
+                                      name='sqlite-writer', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, fn):
+        self._ensure_started()
+        future = concurrent.futures.Future()
+        self._queue.put((fn, future))
+        return future.result(self.timeout)
+
+    def _run(self, jobs_queue):
+        conn = self.get_engine().connect().execution_options(sqlite_begin='BEGIN IMMEDIATE')
+        while True:
+            jobs = [jobs_queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(jobs) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    jobs.append(jobs_queue.get(timeout=remaining) if remaining > 0
+                                else jobs_queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(conn, jobs)
+
+    @staticmethod
+    def _commit(conn, jobs):
+        outcomes = []
+        try:
+            with conn.begin():
+                for fn, future in jobs:
+                    savepoint = conn.begin_nested()
+                    try:
+                        result = fn(conn)
+                    except Exception as exc:
+                        savepoint.rollback()
+                        outcomes.append((future, None, exc))
+                    else:
+                        savepoint.commit()
+                        outcomes.append((future, result, None))
+        except Exception as exc:
+            # The commit itself failed, so nothing in the batch was written.
+            for _, future in jobs:
+                future.set_exception(exc)
+            return
+        for future, result, exc in outcomes:
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
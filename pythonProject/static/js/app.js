@@ -0,0 +1,178 @@
+// Scripts shared by every page.  Each part looks for the elements it works
+// on and does nothing elsewhere, so all pages can load this one cached file.
+
+// Login and password reset: the eye icon shows or hides a password field.
+function togglePassword(fieldId, icon) {
+    const input = document.getElementById(fieldId);
+    if (input.type === "password") {
+        input.type = "text";
+        icon.textContent = "🙈";
+    } else {
+        input.type = "password";
+        icon.textContent = "👁️";
+    }
+}
+
+// Signup: the monkey does the same.
+(function () {
+    const monkeyToggle = document.getElementById("monkeyToggle");
+    const passwordInput = document.getElementById("passwordInput");
+    if (!monkeyToggle) return;
+
+    monkeyToggle.addEventListener("click", function () {
+        const isPassword = passwordInput.type === "password";
+        passwordInput.type = isPassword ? "text" : "password";
+        monkeyToggle.textContent = isPassword ? "🙉" : "🙈"; // Toggle monkey face
+    });
+})();
+
+// Live updates: toggles and deletes go through the JSON API and the page is
+// patched in place from the /events stream, so no click reloads the page.
+(function () {
+    var list = document.getElementById('task-list');
+    if (!list || !window.EventSource || !window.fetch) return;
+    window.liveTasks = true;
+
+    function itemFor(id) { return list.querySelector('.task-item[data-id="' + id + '"]'); }
+
+    function shown(task) {
+        var priority = list.dataset.priority, status = list.dataset.status;
+        return (priority === 'all' || priority === task.priority) &&
+               (status === 'all' || (status === 'done') === task.completed);
+    }
+
+    function removeItem(item) {
+        var group = item.parentNode;
+        item.remove();
+        if (!group.children.length) group.closest('.task-card').remove();
+    }
+
+    function showStale() { document.getElementById('stale-banner').classList.remove('d-none'); }
+
+    function updated(task) {
+        var item = itemFor(task.id);
+        if (!item) return;
+        if (!shown(task)) return removeItem(item);
+        item.querySelector('input[type=checkbox]').checked = task.completed;
+        item.querySelector('.task-text').style.textDecoration = task.completed ? 'line-through' : '';
+    }
+
+    function deleted(task) {
+        var item = itemFor(task.id);
+        if (item) removeItem(item);
+    }
+
+    function created(task) {
+        if (itemFor(task.id) || !shown(task)) return;
+        var group = list.querySelector('ul[data-date="' + task.due_date + '"]');
+        if (!group) return showStale();
+        var item = document.getElementById('task-item-template').content.firstElementChild.cloneNode(true);
+        item.dataset.id = task.id;
+        item.dataset.priority = task.priority;
+        item.querySelector('form').action = '/toggle/' + task.id;
+        item.querySelector('.task-text').textContent = task.text;
+        item.querySelector('.task-meta').textContent = '[' + task.priority + ' - ' + task.time + ']';
+        item.querySelector('.task-delete').href = '/delete/' + task.id;
+        // Open tasks are listed before completed ones.
+        var firstDone = group.querySelector('.task-item input:checked');
+        group.insertBefore(item, firstDone ? firstDone.closest('.task-item') : null);
+        updated(task);
+    }
+
+    // Date headers show "done/total"; only stream events move the counts,
+    // so a local toggle and its echo from the stream are not counted twice.
+    function adjustCount(task, total, done) {
+        var count = list.querySelector('.day-count[data-date="' + task.due_date + '"]');
+        if (!count) return;
+        count.dataset.total = Number(count.dataset.total) + total;
+        count.dataset.done = Number(count.dataset.done) + done;
+        count.textContent = count.dataset.done + '/' + count.dataset.total + ' done';
+    }
+
+    var handlers = {
+        created: function (task) { adjustCount(task, 1, task.completed ? 1 : 0); created(task); },
+        updated: function (task) { adjustCount(task, 0, task.completed ? 1 : -1); updated(task); },
+        deleted: function (task) { adjustCount(task, -1, task.completed ? -1 : 0); deleted(task); }
+    };
+
+    function post(url, id) {
+        return fetch(url, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({ids: [Number(id)]})
+        }).then(function (response) {
+            if (!response.ok) throw new Error(response.status);
+            return response.json();
+        });
+    }
+
+    list.addEventListener('change', function (e) {
+        var item = e.target.closest('.task-item');
+        post('/api/tasks/toggle', item.dataset.id)
+            .then(function (data) { data.tasks.forEach(updated); })
+            .catch(function () { e.target.form.submit(); });
+    });
+
+    list.addEventListener('click', function (e) {
+        var link = e.target.closest('.task-delete');
+        if (!link) return;
+        e.preventDefault();
+        post('/api/tasks/delete', link.closest('.task-item').dataset.id)
+            .then(function (data) { data.tasks.forEach(deleted); })
+            .catch(function () { window.location = link.href; });
+    });
+
+    var source = new EventSource('/events?since=' + list.dataset.version);
+    Object.keys(handlers).forEach(function (kind) {
+        source.addEventListener(kind, function (e) {
+            JSON.parse(e.data).tasks.forEach(handlers[kind]);
+        });
+    });
+    source.addEventListener('stale', showStale);
+})();
+
+// History: older archived tasks are fetched a page at a time as the "Older"
+// link scrolls into view, instead of following it to a new page.
+(function () {
+    var more = document.getElementById('history-more');
+    if (!more || !window.fetch || !window.IntersectionObserver) return;
+    var list = document.getElementById('history-list');
+    var template = document.getElementById('history-item-template');
+    var loading = false;
+
+    function append(task) {
+        var item = template.content.firstElementChild.cloneNode(true);
+        item.querySelector('.task-text').textContent = task.text;
+        item.querySelector('.task-text').style.textDecoration = task.completed ? 'line-through' : '';
+        item.querySelector('.task-meta').textContent = '[' + task.priority + ' - ' + task.due_date + ']';
+        list.appendChild(item);
+    }
+
+    function load() {
+        if (loading || !more.dataset.before) return;
+        loading = true;
+        fetch('/api/tasks/history?before=' + encodeURIComponent(more.dataset.before))
+            .then(function (response) {
+                if (!response.ok) throw new Error(response.status);
+                return response.json();
+            })
+            .then(function (data) {
+                data.tasks.forEach(append);
+                if (data.next_before) {
+                    more.dataset.before = data.next_before;
+                    more.href = '/history?before=' + data.next_before;
+                } else {
+                    observer.disconnect();
+                    more.remove();
+                }
+                loading = false;
+            })
+            .catch(function () { window.location = more.href; });
+    }
+
+    var observer = new IntersectionObserver(function (entries) {
+        if (entries.some(function (entry) { return entry.isIntersecting; })) load();
+    });
+    observer.observe(more);
+    more.addEventListener('click', function (e) { e.preventDefault(); load(); });
+})();
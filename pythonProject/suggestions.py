@@ -0,0 +1,87 @@
+"""Dashboard suggestion engine.
+
+Rules are plain functions ``rule(now, summary) -> iterable of str`` registered
+on a :class:`SuggestionEngine`.  They never query the database themselves:
+``summary`` is the per-user task summary computed once per dashboard hit (see
+``main.task_summary``) and exposes ``open_count(priority)``, ``today_total``
+and ``today_open``.
+"""
+import random
+from datetime import datetime
+
+from cache import LRUCache
+
+GENERIC_TIPS = [
+    "Review your top 3 priorities for the day",
+    "Clear out 5 old emails from your inbox",
+    "Drink a glass of water 💧",
+    "Take a 5-minute deep breathing break 🧘",
+    "Organize your files into folders",
+    "Check your calendar for upcoming events",
+    "Reflect on what went well yesterday",
+    "Watch a short TED Talk",
+    "Listen to your favorite upbeat song 🎵",
+    "Check your tasks marked as 'High'",
+]
+
+
+class SuggestionEngine:
+    """Runs the registered rules and caches the result per user per hour.
+
+    The cache key includes ``summary.signature()``, so a write that changes
+    what the rules would see gets fresh suggestions straight away, while
+    plain reloads within the hour reuse the previous list (and the same
+    random tips).
+    """
+
+    def __init__(self, max_entries=10000):
+        self.rules = []
+        self._cache = LRUCache(max_entries)
+
+    def rule(self, func):
+        self.rules.append(func)
+        return func
+
+    def suggest(self, user_id, summary, now=None):
+        now = now or datetime.now()
+        key = (user_id, now.strftime('%Y-%m-%d %H'), summary.signature())
+        cached = self._cache.get(key)
+        if cached is not None:
+            return list(cached)
+        suggestions = []
+        for rule in self.rules:
+            suggestions.extend(rule(now, summary))
+        self._cache.set(key, tuple(suggestions))
+        return suggestions
+
+    def clear(self):
+        self._cache.clear()
+
+
+engine = SuggestionEngine()
+
+
+@engine.rule
+def weekly_rhythm(now, summary):
+    weekday = now.strftime('%A')
+    if weekday == 'Monday':
+        yield "Plan weekly goals"
+    if weekday == 'Friday':
+        yield "Review weekly progress"
+
+
+@engine.rule
+def morning_planning(now, summary):
+    if now.hour < 10:
+        yield "Prioritize today's tasks"
+
+
+@engine.rule
+def urgent_work(now, summary):
+    if summary.open_count('High'):
+        yield "Focus on urgent tasks"
+
+
+@engine.rule
+def generic_tips(now, summary):
+    return random.sample(GENERIC_TIPS, k=2)
@@ -0,0 +1,47 @@
+"""Shared fixtures.
+
+main reads its settings from the environment when it is imported, so this
+points it at a scratch directory (with two shards) before any test module
+imports it.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+import uuid
+
+import pytest
+
+DATA_DIR = tempfile.mkdtemp(prefix='task-manager-tests-')
+atexit.register(shutil.rmtree, DATA_DIR, True)
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(DATA_DIR, 'tasks.db'),
+    'SHARD_COUNT': '2',
+    'SHARD_DATABASE_URL': 'sqlite:///' + os.path.join(DATA_DIR, 'tasks-shard{n}.db'),
+    'BACKUP_DIR': os.path.join(DATA_DIR, 'backups'),
+    'HASH_WORKERS': '0',
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    'LOGIN_BURST_PER_IP': '1000',
+    'ARCHIVE_INTERVAL': '0',
+    'REMINDER_INTERVAL': '0',
+})
+
+
+@pytest.fixture(scope='session')
+def app():
+    import main
+    with main.app.app_context():
+        main.init_db()
+    return main.app
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as a new user; its id is ``client.user_id``."""
+    client = app.test_client()
+    username = f'user-{uuid.uuid4().hex[:12]}'
+    client.post('/signup', data={'username': username, 'password': 'secret'})
+    assert client.post('/login', data={'username': username, 'password': 'secret'}).status_code == 302
+    with client.session_transaction() as session:
+        client.user_id = int(session['_user_id'])
+    return client
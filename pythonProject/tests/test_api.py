@@ -0,0 +1,64 @@
+import pytest
+
+VALID = {'text': 'write tests', 'priority': 'High', 'due_date': '2026-01-02'}
+
+
+def test_requires_login(app):
+    response = app.test_client().get('/api/tasks')
+    assert response.status_code == 401
+    assert response.get_json() == {'error': 'authentication required'}
+
+
+def test_create_toggle_delete(client):
+    response = client.post('/api/tasks', json={'tasks': [VALID, dict(VALID, text='and more')]})
+    assert response.status_code == 201
+    created = response.get_json()['tasks']
+    assert [t['text'] for t in created] == ['write tests', 'and more']
+    ids = [t['id'] for t in created]
+
+    toggled = client.post('/api/tasks/toggle', json={'ids': ids[:1]}).get_json()['tasks']
+    assert [(t['id'], t['completed']) for t in toggled] == [(ids[0], True)]
+    deleted = client.post('/api/tasks/delete', json={'ids': ids}).get_json()['tasks']
+    assert sorted(t['id'] for t in deleted) == sorted(ids)
+
+
+@pytest.mark.parametrize('field, value', [
+    ('text', 42),
+    ('text', ''),
+    ('text', 'x' * 201),
+    ('priority', ['High']),
+    ('priority', {'High': 1}),
+    ('priority', 3),
+    ('priority', 'Urgent'),
+    ('due_date', 20260102),
+    ('due_date', ['2026-01-02']),
+    ('due_date', 'tomorrow'),
+    ('due_date', None),
+])
+def test_create_rejects_bad_fields(client, field, value):
+    response = client.post('/api/tasks', json={'tasks': [VALID, dict(VALID, **{field: value})]})
+    assert response.status_code == 400
+    assert field.split('_')[0] in response.get_json()['error']
+    # Nothing from the batch was written.
+    assert client.get('/api/tasks').get_json()['tasks'] == []
+
+
+@pytest.mark.parametrize('path, payload', [
+    ('/api/tasks', None),
+    ('/api/tasks', {'tasks': 'nope'}),
+    ('/api/tasks', {'tasks': ['not an object']}),
+    ('/api/tasks/toggle', {'ids': [1, '2']}),
+    ('/api/tasks/toggle', {'ids': [True]}),
+    ('/api/tasks/delete', {'ids': {'1': 1}}),
+    ('/api/tasks/delete', [1, 2]),
+])
+def test_bad_payloads_get_a_json_400(client, path, payload):
+    response = client.post(path, json=payload)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_batch_size_is_capped(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'API_MAX_BATCH', 2)
+    response = client.post('/api/tasks', json={'tasks': [VALID] * 3})
+    assert response.status_code == 400
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+import time
+
+import backup
+
+
+def make_db(path, rows=5000):
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('CREATE TABLE task (id INTEGER PRIMARY KEY, text TEXT)')
+    conn.executemany('INSERT INTO task (text) VALUES (?)', [('x' * 200,)] * rows)
+    conn.commit()
+    return conn
+
+
+def task_count(path):
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+        return conn.execute('SELECT count(*) FROM task').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_full_and_delta_round_trip(tmp_path):
+    db_path = str(tmp_path / 'tasks.db')
+    backup_dir = str(tmp_path / 'backups')
+    conn = make_db(db_path)
+
+    first = backup.snapshot(db_path, backup_dir)
+    assert first['kind'] == 'full'
+
+    conn.execute("UPDATE task SET text = 'changed' WHERE id = 1")
+    conn.commit()
+    second = backup.snapshot(db_path, backup_dir)
+    assert second['kind'] == 'delta'
+    assert 0 < second['pages_written'] < second['page_count']
+
+    conn.execute('DELETE FROM task WHERE id > 4000')
+    conn.commit()
+    conn.execute('VACUUM')
+    backup.snapshot(db_path, backup_dir)
+    conn.close()
+
+    restored = str(tmp_path / 'restored.db')
+    backup.restore(backup_dir, restored)
+    assert task_count(restored) == 4000
+    check = sqlite3.connect(restored)
+    assert check.execute('SELECT text FROM task WHERE id = 1').fetchone()[0] == 'changed'
+    check.close()
+
+
+def test_full_every_forces_a_full_snapshot(tmp_path):
+    db_path = str(tmp_path / 'tasks.db')
+    backup_dir = str(tmp_path / 'backups')
+    make_db(db_path, rows=10).close()
+
+    kinds = [backup.snapshot(db_path, backup_dir, full_every=2)['kind'] for _ in range(4)]
+    assert kinds == ['full', 'delta', 'delta', 'full']
+    # Only the latest entry's page hashes are kept.
+    assert [n for n in os.listdir(backup_dir) if n.endswith('.hashes')] == \
+        [backup.load_manifest(backup_dir)['entries'][-1]['hashes']]
+
+
+def test_snapshot_finishes_while_a_writer_is_active(tmp_path):
+    db_path = str(tmp_path / 'tasks.db')
+    backup_dir = str(tmp_path / 'backups')
+    make_db(db_path, rows=20000).close()
+
+    stop = threading.Event()
+    writes = []
+
+    def writer():
+        conn = sqlite3.connect(db_path, timeout=30)
+        while not stop.is_set():
+            conn.execute("INSERT INTO task (text) VALUES ('new')")
+            conn.commit()
+            writes.append(1)
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        while len(writes) < 10:
+            time.sleep(0.01)
+        result = {}
+        copier = threading.Thread(target=lambda: result.update(backup.snapshot(db_path, backup_dir)))
+        copier.start()
+        copier.join(timeout=30)
+        assert not copier.is_alive(), 'backup did not finish while the writer was running'
+        during = len(writes)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert result['kind'] == 'full'
+    assert during > 10
+    restored = str(tmp_path / 'restored.db')
+    backup.restore(backup_dir, restored)
+    assert 20000 <= task_count(restored) <= 20000 + len(writes)
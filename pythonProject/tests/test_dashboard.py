@@ -0,0 +1,107 @@
+from datetime import date, timedelta
+
+import main
+
+
+def bump_elsewhere(app, user_id):
+    """A write committed by another worker: this worker's cached user
+    keeps the old data_version."""
+    with app.app_context():
+        with main.router.using(main.router.home(user_id)):
+            main.run_write(lambda conn: main.bump_data_version(user_id, conn))
+
+
+def test_etag_revalidates(client):
+    first = client.get('/')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    again = client.get('/', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+
+    client.post('/api/tasks', json={'tasks': [{'text': 'new', 'priority': 'Low', 'due_date': '2026-05-01'}]})
+    changed = client.get('/', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_etag_sees_other_workers_writes(app, client):
+    etag = client.get('/').headers['ETag']
+    assert main.user_cache.get(client.user_id) is not None
+    bump_elsewhere(app, client.user_id)
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_api_list_reports_the_current_version(app, client):
+    before = client.get('/api/tasks').get_json()['version']
+    bump_elsewhere(app, client.user_id)
+    assert client.get('/api/tasks').get_json()['version'] == before + 1
+
+
+def add_tasks(client, *offsets):
+    today = date.today()
+    response = client.post('/api/tasks', json={'tasks': [
+        {'text': f'day {offset}', 'priority': 'Low', 'due_date': (today + timedelta(days=offset)).isoformat()}
+        for offset in offsets]})
+    return {task['text']: task['id'] for task in response.get_json()['tasks']}
+
+
+def page(client, **args):
+    response = client.get('/api/tasks', query_string=args)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def texts(data):
+    return [task['text'] for task in data['tasks']]
+
+
+def test_window_opens_at_the_earliest_open_task(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'DASHBOARD_DAYS_PER_PAGE', 3)
+    ids = add_tasks(client, -30, -20, -10, 0, 1, 2, 3)
+    client.post('/api/tasks/toggle', json={'ids': [ids['day -30'], ids['day -20']]})
+    today = date.today()
+
+    first = page(client)
+    assert texts(first) == ['day -10', 'day 0', 'day 1']
+    assert first['next_after'] == (today + timedelta(days=1)).isoformat()
+    assert first['next_before'] == (today - timedelta(days=10)).isoformat()
+
+    earlier = page(client, before=first['next_before'])
+    assert texts(earlier) == ['day -30', 'day -20']
+    assert earlier['next_before'] is None
+    assert texts(page(client, after=earlier['next_after'])) == ['day -10', 'day 0', 'day 1']
+
+    later = page(client, after=first['next_after'])
+    assert texts(later) == ['day 2', 'day 3']
+    assert later['next_after'] is None
+
+    # With nothing overdue the dashboard opens on today.
+    client.post('/api/tasks/toggle', json={'ids': [ids['day -10']]})
+    opened = page(client)
+    assert texts(opened) == ['day 0', 'day 1', 'day 2']
+    assert opened['next_before'] == today.isoformat()
+    assert texts(page(client, before=opened['next_before'])) == ['day -30', 'day -20', 'day -10']
+    html = client.get('/', query_string={'before': opened['next_before']}).get_data(as_text=True)
+    assert 'day -30' in html and 'Later dates' in html and 'Earlier dates' not in html
+
+
+def test_undated_tasks_come_last_on_the_opening_page(app, client):
+    add_tasks(client, 0)
+    tasks = main.Task.__table__
+    with app.app_context(), main.router.engine(main.router.home(client.user_id)).begin() as conn:
+        conn.execute(tasks.insert().values(text='legacy', due_date=None, completed=False, user_id=client.user_id))
+    assert texts(page(client)) == ['day 0', 'legacy']
+    assert 'legacy' not in texts(page(client, after=date.today().isoformat()))
+    html = client.get('/').get_data(as_text=True)
+    assert html.index('day 0') < html.index('No date') < html.index('legacy')
+
+
+def test_empty_opening_page_links_back(client):
+    ids = add_tasks(client, -5)
+    client.post('/api/tasks/toggle', json={'ids': list(ids.values())})
+    opened = page(client)
+    assert texts(opened) == []
+    assert opened['next_before'] == date.today().isoformat()
+    assert 'Earlier dates' in client.get('/').get_data(as_text=True)
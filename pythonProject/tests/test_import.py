@@ -0,0 +1,86 @@
+import io
+import json
+
+import main
+
+
+def jsonl(*records):
+    return ''.join((r if isinstance(r, str) else json.dumps(r)) + '\n' for r in records).encode()
+
+
+def import_events(client, body, fmt='jsonl'):
+    response = client.post(f'/api/tasks/import?format={fmt}', data=body)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_bad_rows_are_reported_per_line(client):
+    valid = {'text': 'ok', 'priority': 'Low', 'due_date': '2026-02-03'}
+    events = import_events(client, jsonl(
+        valid,
+        dict(valid, text=7),
+        dict(valid, priority=['Low']),
+        dict(valid, due_date=20260203),
+        dict(valid, completed='maybe'),
+        dict(valid, completed=2),
+        dict(valid, time=930),
+        dict(valid, time='half past nine'),
+        'not json',
+        '["a", "list"]',
+        dict(valid, text='done', completed=True, time='09:30'),
+    ))
+    errors = {event['line']: event['error'] for event in events if 'error' in event}
+    assert sorted(errors) == [2, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert 'text' in errors[2]
+    assert 'priority' in errors[3]
+    assert 'due_date' in errors[4]
+    assert 'completed' in errors[5] and 'completed' in errors[6]
+    assert 'time' in errors[7] and 'time' in errors[8]
+    assert events[-1] == {'done': True, 'imported': 2, 'errors': 9}
+
+    tasks = client.get('/api/tasks?date=2026-02-03').get_json()['tasks']
+    assert sorted((t['text'], t['completed'], t['time']) for t in tasks)[0] == ('done', True, '09:30:00')
+
+
+def test_csv_rows(client):
+    body = ('text,priority,due_date,time,completed\n'
+            'from csv,High,2026-02-04,,false\n'
+            'bad date,High,04/02/2026,,\n'
+            'too,many,fields,,,extra\n').encode()
+    events = import_events(client, body, fmt='csv')
+    assert [e['line'] for e in events if 'error' in e] == [3, 4]
+    assert events[-1] == {'done': True, 'imported': 1, 'errors': 2}
+
+
+def test_unknown_format_is_a_400(client):
+    response = client.post('/api/tasks/import', data=b'x', content_type='text/plain')
+    assert response.status_code == 400
+
+
+def test_each_chunk_drops_the_cached_user(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMPORT_CHUNK_SIZE', 2)
+    body = jsonl(*({'text': f'task {n}', 'priority': 'Low', 'due_date': '2026-02-05'} for n in range(6)))
+    response = client.post('/api/tasks/import?format=jsonl', data=body)
+    chunks = 0
+    for line in response.response:
+        event = json.loads(line)
+        if 'imported' in event and 'done' not in event:
+            chunks += 1
+            # Each committed chunk evicts whatever another request cached.
+            assert main.user_cache.get(client.user_id) is None
+            main.user_cache.set(client.user_id, 'stale')
+    response.close()
+    main.user_cache.pop(client.user_id)
+    assert chunks == 3
+
+
+def test_form_import_sets_the_session_version(app, client):
+    body = jsonl({'text': 'form import', 'priority': 'Low', 'due_date': '2026-02-06'})
+    response = client.post('/import', data={'file': (io.BytesIO(body), 'tasks.jsonl')})
+    assert response.status_code == 302
+    users = main.User.__table__
+    with app.app_context(), main.router.engine(main.router.home(client.user_id)).connect() as conn:
+        version = conn.execute(main.db.select(users.c.data_version)
+                               .where(users.c.id == client.user_id)).scalar()
+    with client.session_transaction() as session:
+        assert session['user_version'] == version
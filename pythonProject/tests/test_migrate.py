@@ -0,0 +1,93 @@
+import sqlite3
+
+import migrate
+
+# The schema the app shipped with: strings for dates, times and priorities.
+LEGACY_SCHEMA = '''
+CREATE TABLE user (
+    id INTEGER NOT NULL, username VARCHAR(150) NOT NULL, password VARCHAR(150) NOT NULL,
+    description VARCHAR(500), PRIMARY KEY (id), UNIQUE (username)
+);
+CREATE TABLE task (
+    id INTEGER NOT NULL, text VARCHAR(200) NOT NULL, priority VARCHAR(20), due_date VARCHAR(50),
+    completed BOOLEAN, time VARCHAR(20), user_id INTEGER,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+'''
+
+LEGACY_TASKS = [
+    (1, 'typed', 'High', '2025-06-01', 0, '09:30:00', 1),
+    (2, 'medium', 'Medium', '2025-06-02', 1, '10:00:00.123456', 1),
+    (3, 'junk date', 'Low', 'tomorrow', 0, 'noon', 1),
+    (4, 'no priority', '', '2025-06-03 00:00:00', 0, None, 1),
+    (5, 'numeric priority', '2', '2025-06-04', 0, '08:00:00', 1),
+]
+
+
+def legacy_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO user VALUES (1, 'alice', 'x', '')")
+    conn.executemany('INSERT INTO task VALUES (?, ?, ?, ?, ?, ?, ?)', LEGACY_TASKS)
+    conn.commit()
+    conn.close()
+
+
+def quiet(message):
+    pass
+
+
+def test_migrates_a_legacy_database(tmp_path):
+    path = str(tmp_path / 'tasks.db')
+    legacy_db(path)
+
+    migrate.migrate(path, batch_size=2, pause=0, log=quiet)
+
+    conn = sqlite3.connect(path)
+    assert migrate.is_migrated(conn)
+    rows = conn.execute(f'SELECT {migrate.COLUMNS} FROM task ORDER BY id').fetchall()
+    assert rows == [
+        (1, 'typed', 3, '2025-06-01', 0, '09:30:00', 1),
+        (2, 'medium', 2, '2025-06-02', 1, '10:00:00.123456', 1),
+        (3, 'junk date', 1, None, 0, None, 1),
+        (4, 'no priority', None, '2025-06-03', 0, None, 1),
+        (5, 'numeric priority', 2, '2025-06-04', 0, '08:00:00', 1),
+    ]
+    indexes = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'ix_task_user_due_completed', 'ix_task_user_completed_priority', 'ix_task_open_due'} <= indexes
+    user_columns = {row[1] for row in conn.execute('PRAGMA table_info(user)')}
+    assert {'data_version', 'shard'} <= user_columns
+    assert 'rule_id' in {row[1] for row in conn.execute('PRAGMA table_info(task)')}
+    assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall() == []
+    conn.close()
+
+    # A second run leaves the data alone.
+    migrate.migrate(path, pause=0, log=quiet)
+    conn = sqlite3.connect(path)
+    assert conn.execute(f'SELECT {migrate.COLUMNS} FROM task ORDER BY id').fetchall() == rows
+    conn.close()
+
+
+def test_writes_during_the_copy_are_mirrored(tmp_path):
+    path = str(tmp_path / 'tasks.db')
+    legacy_db(path)
+    conn = migrate.connect(path)
+    migrate.start(conn)
+
+    # The app keeps writing to the old table while rows are copied.
+    conn.execute("INSERT INTO task VALUES (6, 'added', 'High', '2025-07-01', 0, '12:00:00', 1)")
+    conn.execute("UPDATE task SET completed = 1, priority = 'Low' WHERE id = 1")
+    conn.execute('DELETE FROM task WHERE id = 3')
+    migrate.copy_batches(conn, batch_size=2, pause=0, log=quiet)
+    conn.execute("UPDATE task SET text = 'late edit' WHERE id = 2")
+    migrate.swap(conn)
+
+    rows = conn.execute('SELECT id, text, priority, completed FROM task ORDER BY id').fetchall()
+    assert rows == [
+        (1, 'typed', 1, 1),
+        (2, 'late edit', 2, 1),
+        (4, 'no priority', None, 0),
+        (5, 'numeric priority', 2, 0),
+        (6, 'added', 3, 0),
+    ]
+    conn.close()
@@ -0,0 +1,35 @@
+import pytest
+
+import passwords
+
+METHOD = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture
+def hasher():
+    hasher = passwords.PasswordHasher(METHOD, workers=1, queue_depth=2)
+    yield hasher
+    if hasher._executor is not None:
+        hasher._executor.shutdown()
+
+
+def test_hashes_in_a_forkserver_pool(hasher):
+    pwhash = hasher.generate('secret')
+    assert pwhash.startswith(METHOD + '$')
+    assert hasher.check(pwhash, 'secret')
+    assert not hasher.check(pwhash, 'wrong')
+    assert not hasher.needs_rehash(pwhash)
+    assert hasher._executor._mp_context.get_start_method() in ('forkserver', 'spawn')
+
+
+def test_full_queue_is_busy():
+    hasher = passwords.PasswordHasher(METHOD, workers=1, queue_depth=0)
+    with pytest.raises(passwords.HashingBusy):
+        hasher.generate('secret')
+    hasher._executor.shutdown()
+
+
+def test_rate_limiter():
+    limiter = passwords.RateLimiter(per_minute=0.001, burst=2)
+    assert [limiter.allow('alice') for _ in range(3)] == [True, True, False]
+    assert limiter.allow('bob')
@@ -0,0 +1,110 @@
+"""The prepared statements and batched inserts against a real PostgreSQL.
+
+Set TEST_POSTGRES_URL to a scratch database (its tables are dropped and
+recreated); without a reachable server these tests are skipped.
+"""
+import os
+from datetime import date, time
+
+import pytest
+from sqlalchemy import create_engine, exc
+
+import main
+import postgres_mode
+
+PG_URL = os.environ.get('TEST_POSTGRES_URL', 'postgresql://postgres@localhost/tasks_test')
+
+
+@pytest.fixture(scope='module')
+def engine(app):
+    pytest.importorskip('psycopg2')
+    engine = create_engine(PG_URL, **postgres_mode.engine_options(app.config))
+    try:
+        engine.connect().close()
+    except exc.OperationalError as error:
+        pytest.skip(f'no PostgreSQL at {PG_URL}: {error.orig}')
+    main.db.Model.metadata.drop_all(engine)
+    main.db.Model.metadata.create_all(engine)
+    yield engine
+    main.db.Model.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def conn(engine):
+    with engine.connect() as conn:
+        tx = conn.begin()
+        yield conn
+        tx.rollback()
+
+
+def add_user(conn, username):
+    users = main.User.__table__
+    return conn.execute(users.insert().values(username=username, password='x', description='about',
+                                              data_version=3)).inserted_primary_key[0]
+
+
+def prepared_names(conn):
+    return {name for name, in conn.exec_driver_sql('SELECT name FROM pg_prepared_statements')}
+
+
+def test_load_user(conn):
+    user_id = add_user(conn, 'alice')
+    for _ in range(2):
+        row = main.prepared.execute(conn, 'load_user', {'user_id': user_id}).first()
+        assert tuple(row) == (user_id, 'alice', 'about', 3, None)
+    assert 'load_user' in prepared_names(conn)
+    assert main.prepared.execute(conn, 'data_version', {'user_id': user_id}).scalar() == 3
+    assert main.prepared.execute(conn, 'data_version_on_shard', {'user_id': user_id, 'shard': 1}).scalar() is None
+
+
+def test_toggle_task(conn):
+    user_id = add_user(conn, 'bob')
+    other_id = add_user(conn, 'carol')
+    tasks = main.Task.__table__
+    task_id = conn.execute(tasks.insert().values(
+        text='write tests', priority=main.PRIORITY_HIGH, due_date=date(2026, 1, 2),
+        time=time(9, 30), completed=False, user_id=user_id)).inserted_primary_key[0]
+    owned = {'b_task_id': task_id, 'b_user_id': user_id}
+
+    for expected in (True, False, True):
+        assert main.prepared.execute(conn, 'toggle_task', owned).rowcount == 1
+        row = main.prepared.execute(conn, 'owned_task', owned).first()
+        assert row._mapping['completed'] is expected
+    assert {'toggle_task', 'owned_task'} <= prepared_names(conn)
+
+    stranger = {'b_task_id': task_id, 'b_user_id': other_id}
+    assert main.prepared.execute(conn, 'toggle_task', stranger).rowcount == 0
+    assert main.prepared.execute(conn, 'owned_task', stranger).first() is None
+
+
+def test_task_summary(conn):
+    user_id = add_user(conn, 'dave')
+    today = date(2026, 3, 4)
+    main.update_daily_summary(conn, user_id, added=[
+        {'due_date': today, 'priority': main.PRIORITY_HIGH, 'completed': False},
+        {'due_date': today, 'priority': main.PRIORITY_HIGH, 'completed': True},
+        {'due_date': date(2026, 3, 5), 'priority': main.PRIORITY_LOW, 'completed': False},
+    ])
+    main.update_daily_summary(conn, user_id, toggled=[
+        {'due_date': date(2026, 3, 5), 'priority': main.PRIORITY_LOW, 'completed': True},
+    ])
+    rows = main.prepared.execute(conn, 'task_summary', {'user_id': user_id, 'today': today}).all()
+    assert sorted(tuple(row) for row in rows) == [
+        (main.PRIORITY_LOW, 1, 1, 0, 0),
+        (main.PRIORITY_HIGH, 2, 1, 2, 1),
+    ]
+    assert 'task_summary' in prepared_names(conn)
+
+
+def test_insert_returning_ids(conn, app):
+    user_id = add_user(conn, 'erin')
+    tasks = main.Task.__table__
+    # More than one execute_values page.
+    count = app.config['PG_BATCH_PAGE_SIZE'] * 2 + 1
+    rows = [dict(text=f'task {n}', priority=main.PRIORITY_LOW, due_date=date(2026, 1, 1),
+                 time=None, completed=False, user_id=user_id, rule_id=None) for n in range(count)]
+    ids = main.insert_returning_ids(conn, tasks, rows)
+    assert len(set(ids)) == count
+    stored = dict(conn.execute(main.db.select(tasks.c.id, tasks.c.text).where(tasks.c.user_id == user_id)).all())
+    assert [stored[task_id] for task_id in ids] == [row['text'] for row in rows]
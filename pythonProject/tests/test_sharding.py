@@ -0,0 +1,68 @@
+import main
+import shards
+
+TASK = {'text': 'follow me', 'priority': 'Medium', 'due_date': '2026-04-01'}
+
+
+def shard_tasks(app, shard, user_id):
+    tasks = main.Task.__table__
+    with app.app_context(), main.router.engine(shard).connect() as conn:
+        return conn.execute(main.db.select(tasks.c.text).where(tasks.c.user_id == user_id)
+                            .order_by(tasks.c.id)).scalars().all()
+
+
+def move_behind_the_cache(app, client, target):
+    """Move the client's user as another worker would: this worker keeps
+    its cached copy, which still points at the old shard."""
+    client.get('/api/tasks')
+    stale = main.user_cache.get(client.user_id)
+    with app.app_context():
+        main.move_user(client.user_id, target)
+    main.user_cache.set(client.user_id, stale)
+    return stale.shard
+
+
+def test_new_users_live_on_their_home_shard(app, client):
+    assert client.post('/api/tasks', json={'tasks': [TASK]}).status_code == 201
+    home = main.router.home(client.user_id)
+    assert home is not shards.MAIN
+    assert shard_tasks(app, home, client.user_id) == ['follow me']
+    assert shard_tasks(app, shards.MAIN, client.user_id) == []
+
+
+def test_move_user_copies_everything(app, client):
+    client.post('/api/tasks', json={'tasks': [TASK, dict(TASK, text='second')]})
+    home = main.router.home(client.user_id)
+    with app.app_context():
+        assert main.move_user(client.user_id, shards.MAIN) >= 2
+        assert main.move_user(client.user_id, shards.MAIN) == 0
+    assert shard_tasks(app, shards.MAIN, client.user_id) == ['follow me', 'second']
+    assert shard_tasks(app, home, client.user_id) == []
+    # The summary moved with the tasks.
+    assert client.get('/').status_code == 200
+
+
+def test_write_from_a_stale_worker_is_replayed(app, client):
+    client.post('/api/tasks', json={'tasks': [TASK]})
+    old = move_behind_the_cache(app, client, shards.MAIN)
+
+    response = client.post('/api/tasks', json={'tasks': [dict(TASK, text='after the move')]})
+    assert response.status_code == 307
+    assert shard_tasks(app, old, client.user_id) == []
+
+    # 307 keeps the method and body; the replay finds the user afresh.
+    response = client.post('/api/tasks', json={'tasks': [dict(TASK, text='after the move')]},
+                           follow_redirects=True)
+    assert response.status_code == 201
+    assert shard_tasks(app, shards.MAIN, client.user_id) == ['follow me', 'after the move']
+    # Later requests go straight to the new shard.
+    assert client.post('/api/tasks', json={'tasks': [TASK]}).status_code == 201
+
+
+def test_list_from_a_stale_worker_is_replayed(app, client):
+    client.post('/api/tasks', json={'tasks': [TASK]})
+    move_behind_the_cache(app, client, shards.MAIN)
+
+    assert client.get('/api/tasks').status_code == 307
+    response = client.get('/api/tasks', follow_redirects=True)
+    assert [t['text'] for t in response.get_json()['tasks']] == ['follow me']
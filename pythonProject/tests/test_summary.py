@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+import main
+
+
+def summary_rows(conn, user_id):
+    summary = main.DailySummary.__table__
+    return sorted(conn.execute(main.db.select(
+        summary.c.day, summary.c.priority, summary.c.total, summary.c.completed,
+    ).where(summary.c.user_id == user_id)).all())
+
+
+def kept_and_rebuilt(app, user_id):
+    """The user's DailySummary rows as the writes left them, and as
+    rebuild_daily_summary computes them from the task table."""
+    with app.app_context(), main.router.engine(main.router.home(user_id)).connect() as conn:
+        kept = summary_rows(conn, user_id)
+        tx = conn.begin()
+        main.rebuild_daily_summary(conn, user_id)
+        rebuilt = summary_rows(conn, user_id)
+        tx.rollback()
+    return kept, rebuilt
+
+
+def task_ids(app, user_id):
+    tasks = main.Task.__table__
+    with app.app_context(), main.router.engine(main.router.home(user_id)).connect() as conn:
+        return conn.execute(main.db.select(tasks.c.id).where(tasks.c.user_id == user_id)
+                            .order_by(tasks.c.id)).scalars().all()
+
+
+def test_summary_matches_a_full_recompute(app, client):
+    today = date.today()
+    for offset, priority in ((0, 'High'), (0, 'Low'), (1, 'Medium'), (-60, 'High'), (-200, 'Low')):
+        client.post('/', data={'task': f'form {offset} {priority}', 'priority': priority,
+                               'due_date': (today + timedelta(days=offset)).isoformat()})
+    client.post('/', data={'task': 'no priority', 'priority': 'Urgent', 'due_date': today.isoformat()})
+    response = client.post('/api/tasks', json={'tasks': [
+        {'text': f'api {n}', 'priority': 'Medium', 'due_date': (today + timedelta(days=n % 3)).isoformat()}
+        for n in range(6)]})
+    assert response.status_code == 201
+    kept, rebuilt = kept_and_rebuilt(app, client.user_id)
+    assert kept == rebuilt
+    assert sum(total for _, _, total, _ in kept) == 12
+
+    ids = task_ids(app, client.user_id)
+    client.post(f'/toggle/{ids[0]}')
+    client.post(f'/toggle/{ids[1]}')
+    client.post(f'/toggle/{ids[1]}')
+    assert client.post('/api/tasks/toggle', json={'ids': ids[2:5]}).status_code == 200
+    kept, rebuilt = kept_and_rebuilt(app, client.user_id)
+    assert kept == rebuilt
+    assert sum(completed for _, _, _, completed in kept) == 4
+
+    client.get(f'/delete/{ids[5]}')
+    assert client.post('/api/tasks/delete', json={'ids': ids[6:8]}).status_code == 200
+    kept, rebuilt = kept_and_rebuilt(app, client.user_id)
+    assert kept == rebuilt
+    assert sum(total for _, _, total, _ in kept) == 9
+
+    # Archive the overdue task and everything completed a while back.
+    with app.app_context():
+        assert main.archive_tasks(today + timedelta(days=40)) >= 1
+    kept, rebuilt = kept_and_rebuilt(app, client.user_id)
+    assert kept == rebuilt
+    assert sum(total for _, _, total, _ in kept) < 9
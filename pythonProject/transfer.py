@@ -0,0 +1,112 @@
+"""Streaming task export and import in CSV and JSON Lines.
+
+Both directions work one record at a time: exports are generators the
+response streams as they are produced, and imports read the upload line by
+line, so neither ever holds a whole account or a whole file in memory.
+Validation and the database writes stay in ``main``; this module only deals
+with the file formats.
+"""
+import csv
+import io
+import json
+
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+FIELDS = ('id', 'text', 'priority', 'due_date', 'time', 'completed')
+
+# Rows are gathered into chunks of about this many characters per write, so
+# a large export is not sent as thousands of tiny writes.
+FLUSH_CHARS = 64 * 1024
+
+
+class _Line:
+    """File-like target that hands back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def format_for(filename='', mimetype=''):
+    """Guess the format of an upload from its file name or content type."""
+    if filename.lower().endswith('.csv') or mimetype == 'text/csv':
+        return 'csv'
+    if filename.lower().endswith(('.jsonl', '.ndjson')) or mimetype in (
+            'application/x-ndjson', 'application/jsonl', 'application/x-jsonlines'):
+        return 'jsonl'
+    return None
+
+
+def export_lines(records, fmt):
+    """Yield ``records`` (dicts keyed by FIELDS) serialised as ``fmt``."""
+    if fmt == 'csv':
+        writer = csv.writer(_Line())
+        # csv.writer returns whatever the target's write() returned.
+        header = writer.writerow(FIELDS)
+        lines = (writer.writerow([_csv_value(r.get(f)) for f in FIELDS]) for r in records)
+    else:
+        header = ''
+        lines = (json.dumps(r, separators=(',', ':')) + '\n' for r in records)
+
+    buffer, size = [header], len(header)
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_CHARS:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _csv_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return '' if value is None else value
+
+
+def read_records(stream, fmt):
+    """Yield ``(line_number, record, error)`` for each row of an upload.
+
+    ``record`` is a dict of strings (CSV) or JSON values (JSONL) and
+    ``error`` is None, or a message and ``record`` is None.  A file that
+    cannot be decoded at all ends with a single error.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    try:
+        if fmt == 'csv':
+            yield from _read_csv(text)
+        else:
+            yield from _read_jsonl(text)
+    except UnicodeDecodeError:
+        yield 0, None, 'file is not valid UTF-8'
+    finally:
+        # Leave the underlying upload open for its owner to close.
+        text.detach()
+
+
+def _read_csv(text):
+    reader = csv.DictReader(text)
+    line = 1
+    try:
+        for record in reader:
+            line = reader.line_num
+            if None in record:
+                yield line, None, 'too many fields'
+            else:
+                yield line, record, None
+    except csv.Error as error:
+        yield line + 1, None, f'malformed CSV: {error}'
+
+
+def _read_jsonl(text):
+    for line, raw in enumerate(text, 1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError:
+            yield line, None, 'not valid JSON'
+            continue
+        if isinstance(record, dict):
+            yield line, record, None
+        else:
+            yield line, None, 'each line must be a JSON object'